@@ -1,14 +1,22 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from config import Config
 
+try:
+    from flask_sock import Sock
+except ImportError:  # Optional: live sessions fall back to one HTTP POST per frame
+    Sock = None
+
 # Initialize Extensions
 db = SQLAlchemy()
+migrate = Migrate()
 bcrypt = Bcrypt()
 csrf = CSRFProtect()
+sock = Sock() if Sock else None
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login' # Redirect here if unauthorized
 login_manager.login_message_category = 'info'
@@ -19,9 +27,16 @@ def create_app(config_class=Config):
 
     # Init Extensions
     db.init_app(app)
+    if app.config.get('SQLITE_PRAGMAS'):
+        from app.database import apply_sqlite_pragmas
+        with app.app_context():
+            apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    migrate.init_app(app, db)
     bcrypt.init_app(app)
     csrf.init_app(app)
     login_manager.init_app(app)
+    if sock is not None:
+        sock.init_app(app)
 
     # Register Blueprints
     from app.auth.routes import auth
@@ -38,4 +53,9 @@ def create_app(config_class=Config):
     app.register_blueprint(main)
     app.register_blueprint(api, url_prefix='/api')
 
+    # Fail at startup, not on the first frame, when a TCP service has no authkey
+    if app.config.get('INFERENCE_SERVICE_ADDRESS'):
+        from app.inference import service_authkey
+        service_authkey(app.config)
+
     return app
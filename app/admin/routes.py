@@ -4,6 +4,7 @@ from app.admin import admin
 from app.admin.forms import RegistrationForm, EditUserForm
 from app.models import User, Student, Faculty, FaceData
 from flask_login import login_required, current_user
+import traceback
 
 @admin.route("/admin/dashboard")
 @login_required
@@ -16,23 +17,18 @@ def dashboard():
     faculty_count = Faculty.query.count()
     face_count = FaceData.query.count()
     
-    # Chart Data: Last 7 Days Attendance
+    # Chart Data: Last 7 Days Attendance (present or late), from the daily rollup
     from datetime import datetime, timedelta
-    from sqlalchemy import func
-    from app.models import Session, Attendance 
+    from app.models import DailyAttendanceRollup as Rollup
 
-    dates = []
-    counts = []
-    
-    for i in range(6, -1, -1):
-        date = datetime.utcnow().date() - timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        dates.append(date.strftime('%b %d'))
-        
-        # Count attendance for this date
-        # Join Session to filter by date
-        count = Attendance.query.join(Session).filter(Session.date == date).count()
-        counts.append(count)
+    today = datetime.utcnow().date()
+    days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    totals = dict(db.session.query(
+        Rollup.day, db.func.sum(Rollup.present + Rollup.late)
+    ).filter(Rollup.day >= days[0], Rollup.day <= today).group_by(Rollup.day).all())
+
+    dates = [day.strftime('%b %d') for day in days]
+    counts = [int(totals.get(day) or 0) for day in days]
     
     return render_template('admin/dashboard.html', 
                           student_count=student_count, 
@@ -142,6 +138,7 @@ def register_face_capture(student_id):
 @admin.route("/admin/upload_face", methods=['POST'])
 @login_required
 def upload_face():
+    """Legacy path: JSON body with a base64 data URL."""
     if current_user.role != 'admin':
         return {'success': False, 'message': 'Unauthorized'}, 403
     
@@ -150,44 +147,81 @@ def upload_face():
         if not data or 'image' not in data or 'student_id' not in data:
             return {'success': False, 'message': 'Invalid data'}, 400
             
-        from app.utils import save_base64_image, generate_embedding
-        import traceback
+        from app.utils import save_base64_image
         
         student_id = data['student_id']
         image_data = data['image']
         
         # 1. Save Image
         filepath = save_base64_image(image_data, student_id)
-        if not filepath:
-            print("ERROR: save_base64_image returned None")
-            return {'success': False, 'message': 'Failed to save image file'}, 500
-            
-        # 2. Generate Embedding
-        print(f"DEBUG: Calling generate_embedding for {filepath}")
-        embedding = generate_embedding(filepath)
-        if not embedding:
-            print("ERROR: generate_embedding returned None")
-            return {'success': False, 'message': 'No face detected! Please ensure better lighting.'}, 400
-            
-        # 3. Save to DB
-        print(f"DEBUG: Saving to DB for student {student_id}")
-        face_data = FaceData.query.filter_by(student_id=student_id).first()
-        if not face_data:
-            face_data = FaceData(student_id=student_id, image_path=filepath)
-            db.session.add(face_data)
-            
-        face_data.set_embedding(embedding)
-        face_data.image_path = filepath
-        db.session.commit()
-        print("DEBUG: DB Commit Successful")
-        
-        return {'success': True}
+        return register_face_image(student_id, filepath)
         
     except Exception as e:
         print(f"CRITICAL ERROR in upload_face: {e}")
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Internal Server Error: {str(e)}'}), 500
 
+@admin.route("/admin/upload_face/<int:student_id>", methods=['POST'])
+@login_required
+def upload_face_binary(student_id):
+    """Raw JPEG body (or multipart 'image' field), written to disk as received."""
+    if current_user.role != 'admin':
+        return {'success': False, 'message': 'Unauthorized'}, 403
+
+    try:
+        from app.utils import read_uploaded_image, save_image_bytes
+
+        data = read_uploaded_image()
+        if not data:
+            return {'success': False, 'message': 'Invalid data'}, 400
+
+        # 1. Save Image
+        filepath = save_image_bytes(data, student_id)
+        return register_face_image(student_id, filepath)
+
+    except Exception as e:
+        print(f"CRITICAL ERROR in upload_face: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Internal Server Error: {str(e)}'}), 500
+
+def register_face_image(student_id, filepath):
+    """Embeds a saved enrollment image and stores it as the student's FaceData."""
+    from app.utils import generate_embedding
+    from app.inference import InferenceUnavailable
+    from app.quality import QualityRejected
+
+    if not filepath:
+        print("ERROR: Saving the uploaded image failed")
+        return {'success': False, 'message': 'Failed to save image file'}, 500
+        
+    # 2. Generate Embedding
+    print(f"DEBUG: Calling generate_embedding for {filepath}")
+    try:
+        embedding = generate_embedding(filepath)
+    except InferenceUnavailable as e:
+        print(f"ERROR: Inference unavailable: {e}")
+        return {'success': False, 'message': 'Recognition service is busy. Please try again.'}, 503
+    except QualityRejected as e:
+        print(f"ERROR: Enrollment photo rejected: {e}")
+        return {'success': False, 'message': f'{e}. Please retake the photo.'}, 400
+    if not embedding:
+        print("ERROR: generate_embedding returned None")
+        return {'success': False, 'message': 'No face detected! Please ensure better lighting.'}, 400
+        
+    # 3. Save to DB
+    print(f"DEBUG: Saving to DB for student {student_id}")
+    face_data = FaceData.query.filter_by(student_id=student_id).first()
+    if not face_data:
+        face_data = FaceData(student_id=student_id, image_path=filepath)
+        db.session.add(face_data)
+        
+    face_data.set_embedding(embedding)
+    face_data.image_path = filepath
+    db.session.commit()
+    print("DEBUG: DB Commit Successful")
+    
+    return {'success': True}
+
 @admin.route("/admin/create_subject", methods=['GET', 'POST'])
 @login_required
 def create_subject():
@@ -240,8 +274,11 @@ def delete_user(user_id):
     # 3. Handle Student Attendance Records (Manual Cleanup)
     if user.role == "student" and user.student_profile:
         from app.models import Attendance
-        # Delete related attendance records manually
-        Attendance.query.filter_by(student_id=user.student_profile.id).delete()
+        from app.attendance import rollup_attendance
+        # Delete related attendance records manually (and their rollup counts)
+        records = Attendance.query.filter_by(student_id=user.student_profile.id)
+        rollup_attendance([{'session_id': a.session_id, 'status': a.status} for a in records], sign=-1)
+        records.delete()
         
     try:
         db.session.delete(user)
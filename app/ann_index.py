@@ -0,0 +1,197 @@
+import os
+import tempfile
+
+import numpy as np
+
+from app.gallery import Gallery, normalize_rows
+
+
+class IVFIndex:
+    """Approximate nearest-neighbour search over a Gallery (NumPy only).
+
+    IVF layout: rows are clustered with spherical k-means into `n_lists`
+    inverted lists. A query is compared to the centroids, the `nprobe`
+    closest lists are scanned exactly, and the candidates are re-ranked by
+    true cosine distance. Exposes the same match()/with_delta() interface as
+    Gallery so SessionGalleries can use either.
+
+    The index keeps no copy of the vectors: its gallery is stored list by
+    list, so a list scan is a slice of the gallery matrix (the read-only
+    shared memmap once ScopedGallery publishes it). `self.gallery` may
+    therefore be a reordered version of the gallery passed in.
+    """
+
+    def __init__(self, gallery, centroids, assignments, nprobe=8):
+        self.centroids = centroids
+        self.nprobe = nprobe
+        self._pack(gallery, np.asarray(assignments, dtype=np.int32))
+
+    @classmethod
+    def build(cls, gallery, n_lists=None, nprobe=8, iterations=10, sample_size=20000, seed=0):
+        """Trains centroids on a sample of the gallery, then assigns every row."""
+        n_rows = len(gallery)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+
+        rng = np.random.default_rng(seed)
+        sample_idx = rng.choice(n_rows, size=min(n_rows, max(sample_size, n_lists)), replace=False)
+        sample = np.asarray(gallery.matrix[np.sort(sample_idx)], dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty lists from random sample rows
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        index = cls(gallery, centroids, _nearest(gallery.matrix, centroids), nprobe)
+        return index
+
+    # --- Gallery interface ---
+
+    @property
+    def students(self):
+        return self.gallery.students
+
+    @property
+    def matrix(self):
+        return self.gallery.matrix
+
+    def __len__(self):
+        return len(self.gallery)
+
+    def with_delta(self, upserts, removed_ids):
+        """Incremental update into a new index: new rows go to their nearest existing centroid.
+
+        Like Gallery.with_delta, this index is left untouched.
+        """
+        gallery, keep = self.gallery.with_delta(upserts, removed_ids)
+        assignments = self.assignments[keep]
+        if upserts:
+            new_rows = gallery.matrix[len(keep):]
+            assignments = np.concatenate([assignments, _nearest(new_rows, self.centroids)])
+        return IVFIndex(gallery, self.centroids, assignments.astype(np.int32), self.nprobe), keep
+
+    def with_gallery(self, gallery):
+        """The same index over an identical gallery in the same row order (e.g. its published memmap)."""
+        return IVFIndex(gallery, self.centroids, self.assignments, self.nprobe)
+
+    def match(self, targets, nprobe=None):
+        """Same contract as Gallery.match, searching only the probed lists."""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        queries = normalize_rows(np.asarray(targets, dtype=np.float32))
+        n_faces = queries.shape[0]
+
+        best_idx = np.full(n_faces, -1, dtype=np.int64)
+        second_idx = np.full(n_faces, -1, dtype=np.int64)
+        best_dist = np.full(n_faces, np.inf, dtype=np.float32)
+        second_dist = np.full(n_faces, np.inf, dtype=np.float32)
+        if n_faces == 0 or len(self) == 0:
+            return best_idx, best_dist, second_idx, second_dist
+
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        # Scan list by list so each list is one contiguous GEMM against every
+        # face that probes it, keeping a running top-2 per face.
+        best_sim = np.full(n_faces, -np.inf, dtype=np.float32)
+        second_sim = np.full(n_faces, -np.inf, dtype=np.float32)
+        for list_id in np.unique(probes):
+            start, end = self._bounds[list_id], self._bounds[list_id + 1]
+            if start == end:
+                continue
+            faces = np.flatnonzero((probes == list_id).any(axis=1))
+            sims = queries[faces] @ self.gallery.matrix[start:end].T
+            for face, face_sims in zip(faces, sims):
+                top = np.argpartition(-face_sims, 1)[:2] if len(face_sims) > 2 else np.arange(len(face_sims))
+                for t in top:
+                    sim = face_sims[t]
+                    if sim > best_sim[face]:
+                        second_sim[face], second_idx[face] = best_sim[face], best_idx[face]
+                        best_sim[face], best_idx[face] = sim, start + t
+                    elif sim > second_sim[face]:
+                        second_sim[face], second_idx[face] = sim, start + t
+
+        found = best_idx != -1
+        best_dist[found] = 1.0 - best_sim[found]
+        found = second_idx != -1
+        second_dist[found] = 1.0 - second_sim[found]
+        return best_idx, best_dist, second_idx, second_dist
+
+    # --- Persistence ---
+
+    def save(self, path, version):
+        """Atomically writes centroids and row assignments (keyed by student id)."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-ivf-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    assignments=self.assignments,
+                    student_ids=np.asarray([s['id'] for s in self.students], dtype=np.int64),
+                    version=np.int64(version)
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, gallery, nprobe=8):
+        """Reattaches a saved index to `gallery`.
+
+        Rows the saved index already knew keep their list; rows added since
+        are assigned to the nearest centroid. Returns (index, saved version)
+        or None if there is no usable file.
+        """
+        try:
+            with np.load(path) as data:
+                centroids = data['centroids']
+                saved = dict(zip(data['student_ids'].tolist(), data['assignments'].tolist()))
+                version = int(data['version'])
+        except (OSError, KeyError, ValueError):
+            return None
+        if centroids.shape[1:] != gallery.matrix.shape[1:]:
+            return None
+
+        assignments = np.full(len(gallery), -1, dtype=np.int32)
+        for row, student in enumerate(gallery.students):
+            assignments[row] = saved.get(student['id'], -1)
+        missing = np.flatnonzero(assignments < 0)
+        if len(missing):
+            assignments[missing] = _nearest(gallery.matrix[missing], centroids)
+        return cls(gallery, centroids, assignments, nprobe), version
+
+    def _pack(self, gallery, assignments):
+        # Reorder the gallery itself (rows and students) list by list when it
+        # is not already, e.g. after a build or a delta; the caller publishes
+        # the result so every worker maps it instead of holding its own copy.
+        # Deltas repack, which is fine at enrollment rates.
+        order = np.argsort(assignments, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            gallery = Gallery.from_normalized(
+                np.ascontiguousarray(gallery.matrix[order], dtype=np.float32),
+                [gallery.students[i] for i in order]
+            )
+            assignments = assignments[order]
+        self.gallery = gallery
+        self.assignments = assignments
+        self._bounds = np.searchsorted(assignments, np.arange(len(self.centroids) + 1))
+
+
+def _nearest(rows, centroids, chunk=8192):
+    """Index of the most similar centroid for each (normalized) row, chunked to bound memory."""
+    labels = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), chunk):
+        block = np.asarray(rows[start:start + chunk], dtype=np.float32)
+        labels[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+    return labels
@@ -0,0 +1,231 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Attendance, DailyAttendanceRollup, Session, Student, Subject
+
+# Statuses that mean the student was there; Absent rows are materialized by end_session
+ATTENDED_STATUSES = ('Present', 'Late')
+
+# Student ids already marked, per session: { session_id: set(student_id) }.
+# Loaded with one query on first use and updated after each commit, so the
+# per-face "already marked?" check never touches the DB. Other workers' marks
+# are not seen here, but the unique constraint makes re-inserting them a no-op.
+_marked = {}
+_marked_lock = threading.Lock()
+
+
+def marked_students(session_id):
+    with _marked_lock:
+        marked = _marked.get(session_id)
+    if marked is None:
+        rows = db.session.query(Attendance.student_id).filter_by(session_id=session_id).all()
+        marked = {student_id for (student_id,) in rows}
+        with _marked_lock:
+            marked = _marked.setdefault(session_id, marked)
+    return marked
+
+
+def remember_marked(session_id, student_ids):
+    """Adds committed student ids to the session's marked set."""
+    with _marked_lock:
+        _marked.setdefault(session_id, set()).update(student_ids)
+
+
+def forget_marked(session_id, student_ids):
+    """Undoes remember_marked for rows that could not be written."""
+    with _marked_lock:
+        _marked.get(session_id, set()).difference_update(student_ids)
+
+
+def forget_session(session_id):
+    with _marked_lock:
+        _marked.pop(session_id, None)
+
+
+def insert_attendance(rows):
+    """Bulk INSERT ... ON CONFLICT DO NOTHING of Attendance row dicts.
+
+    Pairs that already existed (e.g. marked by another worker a moment
+    earlier) are skipped by the DB, except Absent rows: a real mark that
+    lands after end_session materialized absences (queued in another
+    process's write-behind queue, or from a late frame) replaces them.
+    Returns the set of (student_id, session_id) pairs inserted or upgraded
+    from Absent. The caller commits.
+    """
+    if not rows:
+        return set()
+    rows = [dict(row) for row in rows]
+    for row in rows:
+        row.setdefault('time_marked', datetime.utcnow())
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(Attendance).values(rows).on_conflict_do_nothing(
+            index_elements=['student_id', 'session_id']
+        ).returning(Attendance.student_id, Attendance.session_id)
+        inserted = {tuple(r) for r in db.session.execute(stmt)}
+    else:
+        # Other databases: one savepoint per row, letting the constraint reject duplicates
+        inserted = set()
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(Attendance).values(**row))
+                inserted.add((row['student_id'], row['session_id']))
+            except IntegrityError:
+                pass
+    rollup_attendance([row for row in rows if (row['student_id'], row['session_id']) in inserted])
+
+    # Conflicts are rare (only duplicates and ended sessions), so they are
+    # resolved row by row; the rollup needs to know which rows changed status
+    upgraded = set()
+    for row in rows:
+        pair = (row['student_id'], row['session_id'])
+        if pair in inserted or row.get('status', 'Present') == 'Absent':
+            continue
+        values = {k: v for k, v in row.items() if k not in ('student_id', 'session_id')}
+        values.setdefault('status', 'Present')
+        result = db.session.execute(
+            db.update(Attendance)
+            .where(Attendance.student_id == pair[0], Attendance.session_id == pair[1],
+                   Attendance.status == 'Absent')
+            .values(**values)
+        )
+        if result.rowcount:
+            upgraded.add(pair)
+    if upgraded:
+        changed = [row for row in rows if (row['student_id'], row['session_id']) in upgraded]
+        rollup_attendance([{'session_id': row['session_id'], 'status': 'Absent'} for row in changed], sign=-1)
+        rollup_attendance(changed)
+    return inserted | upgraded
+
+
+def insert_absentees(session):
+    """Adds an Absent row for every student of the session's class not yet marked.
+
+    One INSERT ... SELECT with NOT EXISTS, so reports can count absences
+    directly instead of anti-joining the roster. Returns the number of rows
+    added; the caller commits.
+    """
+    subject = session.subject
+    unmarked = db.select(
+        Student.id,
+        db.literal(session.id),
+        db.literal('Absent'),
+        db.literal(datetime.utcnow(), db.DateTime)
+    ).where(
+        Student.class_name == subject.class_name,
+        ~db.exists().where(Attendance.session_id == session.id, Attendance.student_id == Student.id)
+    )
+    stmt = db.insert(Attendance)
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # A mark committed by another writer after the NOT EXISTS check wins
+        stmt = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(Attendance)
+        stmt = stmt.from_select(['student_id', 'session_id', 'status', 'time_marked'], unmarked) \
+            .on_conflict_do_nothing(index_elements=['student_id', 'session_id'])
+    else:
+        stmt = stmt.from_select(['student_id', 'session_id', 'status', 'time_marked'], unmarked)
+    result = db.session.execute(stmt)
+    added = max(result.rowcount, 0)
+    update_rollup({(session.date, subject.id, subject.class_name): {'absent': added}})
+    return added
+
+
+# --- Daily rollup ---
+# DailyAttendanceRollup holds the counters dashboards read. Every write path
+# that adds or removes Attendance (or starts a Session) adjusts them in the
+# same transaction, so they cannot drift from the rows they summarize.
+
+ROLLUP_COUNTERS = ('sessions', 'present', 'late', 'absent')
+STATUS_COUNTERS = {'Present': 'present', 'Late': 'late', 'Absent': 'absent'}
+ROLLUP_CHUNK = 500
+
+
+def update_rollup(deltas):
+    """Adds `deltas` {(day, subject_id, class_name): {counter: n}} to the rollup."""
+    deltas = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not deltas:
+        return
+    rows = [
+        dict({'day': day, 'subject_id': subject_id, 'class_name': class_name},
+             **{c: counts.get(c, 0) for c in ROLLUP_COUNTERS})
+        for (day, subject_id, class_name), counts in deltas.items()
+    ]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        for start in range(0, len(rows), ROLLUP_CHUNK):  # Stay under bound-parameter limits
+            stmt = insert(DailyAttendanceRollup).values(rows[start:start + ROLLUP_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['day', 'subject_id', 'class_name'],
+                set_={c: getattr(DailyAttendanceRollup, c) + getattr(stmt.excluded, c) for c in ROLLUP_COUNTERS}
+            )
+            db.session.execute(stmt)
+        return
+
+    for row in rows:
+        key = {k: row[k] for k in ('day', 'subject_id', 'class_name')}
+        updated = db.session.execute(
+            db.update(DailyAttendanceRollup).filter_by(**key).values(
+                {c: getattr(DailyAttendanceRollup, c) + row[c] for c in ROLLUP_COUNTERS}
+            )
+        ).rowcount
+        if not updated:
+            db.session.execute(db.insert(DailyAttendanceRollup).values(**row))
+
+
+def rollup_attendance(rows, sign=1):
+    """Counts Attendance row dicts (session_id, status) into the rollup; sign=-1 removes them."""
+    if not rows:
+        return
+    session_ids = {row['session_id'] for row in rows}
+    keys = {
+        session_id: (day, subject_id, class_name)
+        for session_id, day, subject_id, class_name in db.session.query(
+            Session.id, Session.date, Session.subject_id, Subject.class_name
+        ).join(Subject, Subject.id == Session.subject_id).filter(Session.id.in_(session_ids))
+    }
+    deltas = {}
+    for row in rows:
+        counter = STATUS_COUNTERS.get(row.get('status') or 'Present')
+        key = keys.get(row['session_id'])
+        if counter and key:
+            counts = deltas.setdefault(key, {})
+            counts[counter] = counts.get(counter, 0) + sign
+    update_rollup(deltas)
+
+
+def rollup_session_started(session, subject):
+    update_rollup({(session.date, subject.id, subject.class_name): {'sessions': 1}})
+
+
+def rebuild_rollup():
+    """Recomputes the whole rollup from Session and Attendance. The caller commits."""
+    deltas = {}
+    session_counts = db.session.query(
+        Session.date, Session.subject_id, Subject.class_name, db.func.count(Session.id)
+    ).join(Subject, Subject.id == Session.subject_id) \
+     .group_by(Session.date, Session.subject_id, Subject.class_name)
+    for day, subject_id, class_name, n in session_counts:
+        deltas.setdefault((day, subject_id, class_name), {})['sessions'] = n
+
+    status_counts = db.session.query(
+        Session.date, Session.subject_id, Subject.class_name, Attendance.status, db.func.count(Attendance.id)
+    ).join(Session, Session.id == Attendance.session_id) \
+     .join(Subject, Subject.id == Session.subject_id) \
+     .group_by(Session.date, Session.subject_id, Subject.class_name, Attendance.status)
+    for day, subject_id, class_name, status, n in status_counts:
+        counter = STATUS_COUNTERS.get(status or 'Present')
+        if counter:
+            deltas.setdefault((day, subject_id, class_name), {})[counter] = n
+
+    db.session.execute(db.delete(DailyAttendanceRollup))
+    update_rollup(deltas)
+    return len(deltas)
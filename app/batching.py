@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesces embedding requests from concurrent frames into one forward pass.
+
+    Callers (one per in-flight frame, typically from different sessions)
+    submit a stack of aligned face crops. A single background thread waits
+    up to `max_latency_ms` after the first request for more to arrive, runs
+    `batch_fn` once on up to `max_batch_size` crops, and hands each caller
+    back its own rows. A request larger than `max_batch_size` is split
+    across consecutive batches.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_latency_ms=5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self._pending = []  # [(future, crops, results_so_far, offset)]
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='embed-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, crops):
+        """Queues a (n, h, w, 3) crop stack; the Future resolves to an (n, dim) array."""
+        future = Future()
+        if len(crops) == 0:
+            future.set_result(np.empty((0, 0), dtype=np.float32))
+            return future
+        with self._cond:
+            self._pending.append([future, crops, [], 0])
+            self._cond.notify()
+        return future
+
+    def embed(self, crops, timeout=None):
+        return self.submit(crops).result(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent frames a moment to join this batch
+                deadline = time.monotonic() + self.max_latency
+                while self._queued() < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                parts = self._take_batch()
+            self._execute(parts)
+
+    def _queued(self):
+        return sum(len(crops) - offset for _, crops, _, offset in self._pending)
+
+    def _take_batch(self):
+        """Pops up to max_batch_size crops (caller holds the lock)."""
+        parts, room = [], self.max_batch_size
+        while self._pending and room:
+            entry = self._pending[0]
+            _, crops, _, offset = entry
+            take = min(room, len(crops) - offset)
+            parts.append((entry, offset, take))
+            entry[3] += take
+            room -= take
+            if entry[3] == len(crops):
+                self._pending.pop(0)
+        return parts
+
+    def _execute(self, parts):
+        batch = np.concatenate([entry[1][offset:offset + take] for entry, offset, take in parts])
+        try:
+            embeddings = np.asarray(self.batch_fn(batch))
+        except Exception as e:
+            failed = [entry for entry, _, _ in parts]
+            failed_ids = {id(entry) for entry in failed}
+            with self._cond:
+                # Drop the unsent remainder of any split request that failed
+                self._pending = [entry for entry in self._pending if id(entry) not in failed_ids]
+            for entry in failed:
+                if not entry[0].done():
+                    entry[0].set_exception(e)
+            return
+
+        row = 0
+        for entry, offset, take in parts:
+            future, crops, results, _ = entry
+            results.append(embeddings[row:row + take])
+            row += take
+            if offset + take == len(crops) and not future.done():
+                future.set_result(np.concatenate(results))
@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+class TTLCache:
+    """In-process cache of computed values with single-flight refresh.
+
+    When an entry expires, the first caller recomputes it; concurrent callers
+    get the stale value meanwhile (or wait, if there is none yet), so a burst
+    of requests costs one computation instead of one each.
+    """
+
+    def __init__(self):
+        self._entries = {}  # key: (value, expires_at)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, compute, ttl):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        lock = self._lock_for(key)
+        if entry is not None and not lock.acquire(blocking=False):
+            return entry[0]  # Someone else is refreshing it
+        if entry is None:
+            lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]  # Refreshed while we waited
+            value = compute()
+            self._entries[key] = (value, time.monotonic() + ttl)
+            return value
+        finally:
+            lock.release()
+
+    def invalidate(self, key=None):
+        with self._guard:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
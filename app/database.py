@@ -0,0 +1,20 @@
+from sqlalchemy import event
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Runs `PRAGMA key=value` on every new connection of a SQLite engine.
+
+    Must be called before the engine opens its first connection; other
+    dialects are left alone.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
@@ -0,0 +1,153 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import db
+from app.events import publish
+from app.attendance import ATTENDED_STATUSES
+from app.models import Attendance, Session, Student, StudentEngagement, Subject
+
+ENGAGEMENT_COLUMNS = ['student_id', 'subject_id', 'sessions_held', 'attended', 'attendance_ratio',
+                      'absence_streak', 'longest_absence_streak', 'at_risk']
+
+INSERT_CHUNK = 5000
+
+
+def compute_engagement(sessions, roster, attendance, min_ratio=0.75, max_streak=3, min_sessions=3):
+    """Per (student, subject) attendance summary in one vectorized pass.
+
+    sessions:   session_id, subject_id, class_name, date, start_time (ended sessions)
+    roster:     student_id, class_name
+    attendance: student_id, session_id (rows that count as attended)
+
+    Every student of a subject's class is expected at each of its sessions;
+    a session without an attended row is a miss. Streaks are runs of misses
+    in session order. A student is at risk, once at least `min_sessions` have
+    been held, when their ratio is below `min_ratio` or the current streak
+    reached `max_streak`.
+    """
+    if sessions.empty or roster.empty:
+        return pd.DataFrame(columns=ENGAGEMENT_COLUMNS)
+
+    sessions = sessions.sort_values(['date', 'start_time', 'session_id'])
+    # Inner merge keeps the left (chronological) order
+    expected = sessions[['session_id', 'subject_id', 'class_name']].merge(
+        roster[['student_id', 'class_name']], on='class_name'
+    )
+    student = expected['student_id'].to_numpy(np.int64)
+    subject = expected['subject_id'].to_numpy(np.int64)
+    session = expected['session_id'].to_numpy(np.int64)
+
+    # Attended lookup on one int64 key per (student, session) pair
+    span = int(max(session.max(), attendance['session_id'].max() if len(attendance) else 0)) + 1
+    attended_keys = (attendance['student_id'].to_numpy(np.int64) * span
+                     + attendance['session_id'].to_numpy(np.int64))
+    hit = pd.Index(attended_keys).unique().get_indexer(student * span + session) >= 0
+
+    # Group rows by (student, subject), keeping session order inside a group
+    pair = student * (int(subject.max()) + 1) + subject
+    order = np.argsort(pair, kind='stable')
+    pair, hit = pair[order], hit[order]
+    starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+    ends = np.r_[starts[1:], len(pair)]
+
+    held = ends - starts
+    attended = np.add.reduceat(hit.astype(np.int64), starts)
+
+    # Length of the run of misses ending at each row: misses so far minus the
+    # misses counted at the last attended session (or group start)
+    missed = (~hit).astype(np.int64)
+    total = np.cumsum(missed)
+    reset = hit.copy()
+    reset[starts] = True
+    base = np.where(reset, total - missed, 0)
+    streak = total - np.maximum.accumulate(base)
+
+    result = pd.DataFrame({
+        'student_id': student[order][starts],
+        'subject_id': subject[order][starts],
+        'sessions_held': held,
+        'attended': attended,
+        'attendance_ratio': np.round(attended / held, 4),
+        'absence_streak': streak[ends - 1],
+        'longest_absence_streak': np.maximum.reduceat(streak, starts)
+    })
+    result['at_risk'] = (result['sessions_held'] >= min_sessions) & (
+        (result['attendance_ratio'] < min_ratio) | (result['absence_streak'] >= max_streak)
+    )
+    return result[ENGAGEMENT_COLUMNS]
+
+
+def load_engagement_inputs(subject_ids=None):
+    """DataFrames for compute_engagement from ended sessions (optionally of some subjects)."""
+    session_query = db.select(
+        Session.id.label('session_id'), Session.subject_id, Subject.class_name, Session.date, Session.start_time
+    ).join(Subject, Subject.id == Session.subject_id).where(Session.is_active.is_(False))
+    attendance_query = db.select(Attendance.student_id, Attendance.session_id) \
+        .join(Session, Session.id == Attendance.session_id) \
+        .where(Session.is_active.is_(False), Attendance.status.in_(ATTENDED_STATUSES))
+    if subject_ids is not None:
+        session_query = session_query.where(Session.subject_id.in_(subject_ids))
+        attendance_query = attendance_query.where(Session.subject_id.in_(subject_ids))
+
+    connection = db.session.connection()
+    sessions = pd.read_sql(session_query, connection)
+    classes = sessions['class_name'].unique().tolist()
+    roster = pd.read_sql(
+        db.select(Student.id.label('student_id'), Student.class_name).where(Student.class_name.in_(classes)),
+        connection
+    )
+    # Attendance is by far the largest input (one row per mark): its integer
+    # columns need no result processing, so read the DBAPI cursor directly
+    # instead of building a Row per mark
+    result = connection.execute(attendance_query)
+    attendance = pd.DataFrame(result.cursor.fetchall(), columns=['student_id', 'session_id'])
+    result.close()
+    return sessions, roster, attendance
+
+
+def refresh_engagement(config, subject_ids=None):
+    """Recomputes StudentEngagement for `subject_ids` (None = all). The caller commits."""
+    inputs = load_engagement_inputs(subject_ids)
+    result = compute_engagement(
+        *inputs,
+        min_ratio=config.get('ENGAGEMENT_MIN_RATIO', 0.75),
+        max_streak=config.get('ENGAGEMENT_MAX_ABSENCE_STREAK', 3),
+        min_sessions=config.get('ENGAGEMENT_MIN_SESSIONS', 3)
+    )
+
+    stale = db.delete(StudentEngagement)
+    if subject_ids is not None:
+        stale = stale.where(StudentEngagement.subject_id.in_(subject_ids))
+    db.session.execute(stale)
+
+    records = result.assign(updated_at=datetime.utcnow()).to_dict('records')
+    for start in range(0, len(records), INSERT_CHUNK):
+        db.session.execute(db.insert(StudentEngagement), records[start:start + INSERT_CHUNK])
+    return len(records)
+
+
+# Background refreshes are serialized so two ending sessions never replace
+# the same rows concurrently
+_refresh_lock = threading.Lock()
+
+
+def refresh_engagement_async(app, subject_ids):
+    """Refreshes the given subjects in a daemon thread (used when a session ends)."""
+    def run():
+        with _refresh_lock, app.app_context():
+            try:
+                rows = refresh_engagement(app.config, subject_ids)
+                db.session.commit()
+                print(f"DEBUG: Engagement refreshed for subjects {subject_ids}: {rows} rows.")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Engagement Refresh Error: {e}")
+                return
+        publish('engagement', subject_ids=list(subject_ids))
+
+    thread = threading.Thread(target=run, name='engagement-refresh', daemon=True)
+    thread.start()
+    return thread
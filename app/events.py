@@ -0,0 +1,38 @@
+class EventBus:
+    """In-process notifications of committed changes (attendance, unknown
+    faces, sessions, engagement).
+
+    Listeners run synchronously on publish, e.g. to drop the dashboard stats
+    cache so the next poll sees the change. Only this process's events are
+    seen: with several gunicorn workers the others rely on the cache TTL.
+    """
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Calls callback(kind, data) synchronously on every publish, e.g. to drop caches."""
+        self._listeners.append(callback)
+
+    def publish(self, kind, data):
+        for callback in self._listeners:
+            try:
+                callback(kind, data)
+            except Exception as e:
+                print(f"Event listener Error: {e}")
+
+
+bus = EventBus()
+
+
+def publish(kind, **data):
+    bus.publish(kind, data)
+
+
+def publish_attendance(pairs):
+    """One 'attendance' event per session for committed (student_id, session_id) pairs."""
+    by_session = {}
+    for student_id, session_id in pairs:
+        by_session.setdefault(session_id, set()).add(student_id)
+    for session_id, student_ids in by_session.items():
+        publish('attendance', session_id=session_id, student_ids=sorted(student_ids))
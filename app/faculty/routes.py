@@ -1,13 +1,28 @@
 from flask import render_template, url_for, flash, redirect, request, jsonify
-from app import db
+from app import db, sock
 from app.faculty import faculty
-from app.models import Subject, Session, Student, FaceData, Attendance
+from app.models import Subject, Session
+from app.gallery import SessionGalleries, gallery_version
+from app.gallery_store import get_gallery_store
+from app.inference import run_inference, InferenceUnavailable
+from app.tracking import SessionTracker
+from app.motion import MotionGate
+from app.utils import read_uploaded_image
+from app.frames import FrameSource, crop_faces
+from app.quality import QualityGate
+from app.attendance import (ATTENDED_STATUSES, marked_students, remember_marked, forget_session, insert_attendance,
+                            insert_absentees, rollup_session_started)
+from app.writer import get_writer, flush_writes
+from app.events import publish, publish_attendance
+from app.engagement import refresh_engagement_async
 from flask_login import login_required, current_user
 from datetime import datetime
 import base64
 import cv2
 import numpy as np
-import os
+import json
+import time
+from urllib.parse import urlparse
 # from deepface import DeepFace # Lazy load
 from flask import current_app
 
@@ -30,7 +45,9 @@ def start_session(subject_id):
         
     session = Session(subject_id=subject.id, date=datetime.utcnow().date())
     db.session.add(session)
+    rollup_session_started(session, subject)
     db.session.commit()
+    publish('session', session_id=session.id, subject_id=subject.id, state='started')
     
     return redirect(url_for('faculty.attendance_session', session_id=session.id))
 
@@ -43,59 +60,148 @@ def attendance_session(session_id):
         flash('Unauthorized Access', 'danger')
         return redirect(url_for('faculty.dashboard'))
         
-    return render_template('faculty/session.html', session=session)
+    # Absent rows of an ended session are not marks
+    present_records = [r for r in session.attendance_records if r.status in ATTENDED_STATUSES]
+    return render_template('faculty/session.html', session=session, present_records=present_records,
+                           stream_enabled=sock is not None)
 
-@faculty.route("/faculty/end_session/<int:session_id>")
+@faculty.route("/faculty/end_session/<int:session_id>", methods=['POST'])
 @login_required
 def end_session(session_id):
+    if current_user.role != 'faculty':
+        return "Unauthorized", 403
     session = Session.query.get_or_404(session_id)
-    session.end_time = datetime.utcnow().time()
-    session.is_active = False
-    db.session.commit()
+    if session.subject.faculty_id != current_user.faculty_profile.id:
+        return "Unauthorized", 403
+    # Frames arriving from now on are refused, so they cannot rebuild the state evicted below
+    ended_sessions.add(session_id)
+    # Attendance still queued by the write-behind writer must land before the session closes
+    flush_writes()
+    try:
+        absent = insert_absentees(session)
+        session.end_time = datetime.utcnow().time()
+        session.is_active = False
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        ended_sessions.discard(session_id)
+        raise
+    publish('session', session_id=session.id, subject_id=session.subject_id, state='ended')
+    evict_session_state(session_id)
+    # Attendance ratios and at-risk flags for this subject, off the request thread
+    refresh_engagement_async(current_app._get_current_object(), [session.subject_id])
+    writer = get_writer()
+    if writer:
+        writer.log('INFO', f"Session {session.id} ended ({absent} absent)")
     flash('Session Ended. Attendance saved.', 'success')
     return redirect(url_for('faculty.dashboard'))
 
 # GLOBAL CACHE for Embeddings
-# Structure: { session_id: { 'embeddings': [list], 'map': { index: student_obj } } }
+# Structure: { session_id: SessionGalleries } (see app/gallery.py)
 active_sessions_cache = {}
 
+# Face tracks per live session camera: { (session_id, camera_id): SessionTracker } (see app/tracking.py)
+session_trackers = {}
+
+def get_session_tracker(camera_key):
+    if camera_key not in session_trackers:
+        config = current_app.config
+        session_trackers[camera_key] = SessionTracker(
+            iou_threshold=config.get('TRACK_IOU_THRESHOLD', 0.3),
+            reverify_every=config.get('TRACK_REVERIFY_FRAMES', 10),
+            unknown_retry_every=config.get('TRACK_UNKNOWN_RETRY_FRAMES', 1),
+            max_missed=config.get('TRACK_MAX_MISSED_FRAMES', 5),
+            confident_dist=config.get('TRACK_CONFIDENT_DIST', 0.45)
+        )
+    return session_trackers[camera_key]
+
+# Change detection per live session camera: { (session_id, camera_id): MotionGate } (see app/motion.py)
+session_motion_gates = {}
+
+def get_motion_gate(camera_key):
+    if camera_key not in session_motion_gates:
+        config = current_app.config
+        session_motion_gates[camera_key] = MotionGate(
+            pixel_delta=config.get('MOTION_PIXEL_DELTA', 12),
+            min_changed_fraction=config.get('MOTION_MIN_CHANGED_FRACTION', 0.005),
+            max_skip_seconds=config.get('MOTION_MAX_SKIP_SECONDS', 5)
+        )
+    return session_motion_gates[camera_key]
+
+def forget_track_identities(session_id, student_ids):
+    """Makes every camera of a session re-identify tracks of these students."""
+    cleared = sum(tracker.forget_identities(student_ids)
+                  for key, tracker in list(session_trackers.items()) if key[0] == session_id)
+    if cleared:
+        print(f"DEBUG: Gallery changed for {len(student_ids)} student(s); re-identifying {cleared} track(s).")
+
+def reset_camera_state(session_id):
+    """Drops the tracks and motion references of every camera in a session."""
+    for cache in (session_trackers, session_motion_gates):
+        for key in [k for k in cache if k[0] == session_id]:
+            del cache[key]
+
+# Sessions ended by this process. Frames for them are refused before any
+# gallery, tracker or marked set is built (other processes fall back to the
+# is_active check)
+ended_sessions = set()
+
+def evict_session_state(session_id):
+    """Frees the gallery, tracks, motion references and marked set of a session."""
+    active_sessions_cache.pop(session_id, None)
+    reset_camera_state(session_id)
+    forget_session(session_id)
+
+def retire_session(session_id):
+    """A frame found the session inactive (ended by another process): refuse
+    further frames here and free whatever state this process still holds."""
+    ended_sessions.add(session_id)
+    evict_session_state(session_id)
+
+def build_session_galleries(session, rebuild=False):
+    """Loads the gallery of the class attending this session.
+
+    Uses the host's shared gallery store when one is published; rebuild=True
+    reloads from the DB and republishes.
+    """
+    return SessionGalleries(
+        session.subject.class_name,
+        fallback_scope=current_app.config.get('GALLERY_FALLBACK_SCOPE'),
+        store=get_gallery_store(),
+        rebuild=rebuild
+    )
+
 @faculty.route("/faculty/refresh_cache_manual/<int:session_id>", methods=['POST'])
 @login_required
 def refresh_cache_manual(session_id):
     print(f"DEBUG: Manual Cache Refresh for Session {session_id}")
+    if session_id in ended_sessions:
+        return jsonify({'success': False, 'message': 'Session inactive'})
     try:
         if session_id in active_sessions_cache:
             del active_sessions_cache[session_id]
+        # Identities carried by tracks may be stale after a rebuild
+        reset_camera_state(session_id)
         
-        # Rebuild logic (could be helper function, but simple enough to repeat for now)
-        students = Student.query.all()
-        known_embeddings = []
-        student_map = {}
-        for i, student in enumerate(students):
-            if student.face_data:
-                emb = student.face_data.get_embedding()
-                if emb:
-                    known_embeddings.append(emb)
-                    student_map[len(known_embeddings)-1] = student
-        
-        active_sessions_cache[session_id] = {
-            'embeddings': known_embeddings,
-            'map': student_map
-        }
-        return jsonify({'success': True, 'count': len(known_embeddings)})
+        session = Session.query.get_or_404(session_id)
+        galleries = build_session_galleries(session, rebuild=True)
+        active_sessions_cache[session_id] = galleries
+        return jsonify({'success': True, 'count': len(galleries)})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 @faculty.route("/faculty/process_frame", methods=['POST'])
 @login_required
 def process_frame():
-    from deepface import DeepFace
+    """Legacy path: JSON body with a base64 data URL."""
     data = request.get_json()
     image_data = data['image']
     session_id = data['session_id']
     
     session = Session.query.get(session_id)
     if not session or not session.is_active:
+        if session:
+            retire_session(session.id)
         return {'success': False, 'message': 'Session inactive'}, 400
 
     # 1. Decode Image
@@ -105,49 +211,154 @@ def process_frame():
         frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     except Exception as e:
         return {'success': False, 'message': 'Image Decode Error'}, 400
+    if frame is None:
+        return {'success': False, 'message': 'Image Decode Error'}, 400
+
+    frame = FrameSource.from_image(frame, current_app.config.get('DETECT_DOWNSCALE', 1))
+    return recognize_frame(session, frame, data.get('camera_id'))
+
+@faculty.route("/faculty/process_frame/<int:session_id>", methods=['POST'])
+@login_required
+def process_frame_binary(session_id):
+    """Raw JPEG body (or multipart 'image' field); camera in the X-Camera-Id header."""
+    session = Session.query.get(session_id)
+    if not session or not session.is_active:
+        if session:
+            retire_session(session.id)
+        return {'success': False, 'message': 'Session inactive'}, 400
+
+    # 1. Decode Image straight from the request buffer (detection level only;
+    # full resolution is decoded later if a face needs embedding)
+    data = read_uploaded_image()
+    frame = FrameSource.from_jpeg(data, current_app.config.get('DETECT_DOWNSCALE', 1)) if data else None
+    if frame is None:
+        return {'success': False, 'message': 'Image Decode Error'}, 400
+
+    return recognize_frame(session, frame, request.headers.get('X-Camera-Id'))
+
+def frame_stream(ws, session_id):
+    """One WebSocket per live session camera.
+
+    Auth and the session lookup happen once, at connect. Protocol: the
+    server sends {"type": "ready"} whenever it wants a frame; the client
+    answers with one binary JPEG message and waits for the next "ready".
+    Each frame gets a {"type": "result", ...} message with the same fields
+    as the HTTP endpoint, so the server paces the camera.
+    """
+    # Browsers send cookies on cross-site WebSocket handshakes and there is no
+    # CSRF token here, so the Origin must be this site
+    origin = request.headers.get('Origin')
+    if origin and urlparse(origin).netloc != request.host:
+        ws.send(json.dumps({'type': 'error', 'message': 'Forbidden origin'}))
+        return
+    if not current_user.is_authenticated or current_user.role != 'faculty':
+        ws.send(json.dumps({'type': 'error', 'message': 'Unauthorized'}))
+        return
+    session = Session.query.get(session_id)
+    if not session or session.subject.faculty_id != current_user.faculty_profile.id:
+        ws.send(json.dumps({'type': 'error', 'message': 'Unauthorized'}))
+        return
+    if not session.is_active:
+        retire_session(session.id)
+        ws.send(json.dumps({'type': 'error', 'message': 'Session inactive'}))
+        return
+
+    # Keep the loaded session (and subject) usable without the DB session, then
+    # release the connection so an idle stream holds no SQLite locks
+    db.session.expunge(session)
+    db.session.close()
+
+    config = current_app.config
+    camera_id = request.args.get('camera')
+    min_interval = config.get('STREAM_MIN_FRAME_INTERVAL_MS', 250) / 1000.0
+    busy_retry = config.get('STREAM_BUSY_RETRY_MS', 500) / 1000.0
+    check_every = config.get('STREAM_SESSION_CHECK_SECONDS', 10)
+    downscale = config.get('DETECT_DOWNSCALE', 1)
+    last_check = time.monotonic()
+
+    ws.send(json.dumps({'type': 'ready'}))
+    while True:
+        # Wake up at least once a second to notice the session ending here
+        message = ws.receive(timeout=1)
+        if session_id in ended_sessions:
+            ws.send(json.dumps({'type': 'ended', 'message': 'Session inactive'}))
+            return
+        started = time.monotonic()
+        if not isinstance(message, (bytes, bytearray)):
+            continue  # Text messages are keep-alives (None = receive timed out)
+
+        if started - last_check >= check_every:
+            last_check = started
+            if not db.session.query(Session.is_active).filter_by(id=session_id).scalar():
+                retire_session(session_id)
+                ws.send(json.dumps({'type': 'ended', 'message': 'Session inactive'}))
+                return
+
+        frame = FrameSource.from_jpeg(message, downscale)
+        if frame is None:
+            result, status = {'success': False, 'message': 'Image Decode Error'}, 400
+        else:
+            result = recognize_frame(session, frame, camera_id)
+            result, status = result if isinstance(result, tuple) else (result, 200)
+        db.session.close()
+
+        ws.send(json.dumps(dict(result, type='result')))
+        # Backpressure: ask for the next frame only when we can take it
+        wait = busy_retry if status == 503 else min_interval - (time.monotonic() - started)
+        if wait > 0:
+            time.sleep(wait)
+        ws.send(json.dumps({'type': 'ready'}))
+
+if sock is not None:
+    sock.route('/faculty/stream/<int:session_id>', bp=faculty)(frame_stream)
+
+def recognize_frame(session, frame, camera_id=None):
+    """Runs a frame (a FrameSource) through gating, detection, tracking and matching.
+
+    Detection sees the downscaled level; embeddings are computed from
+    crops of the full-resolution frame, and boxes are reported in
+    full-resolution pixels.
+    """
+    if session.id in ended_sessions:
+        return {'success': False, 'message': 'Session inactive'}, 400
+    try:
+        return _recognize_frame(session, frame, camera_id)
+    finally:
+        # The session ended while this frame was in flight: drop what it rebuilt
+        if session.id in ended_sessions:
+            evict_session_state(session.id)
+
+def _recognize_frame(session, frame, camera_id):
+    session_id = session.id
+    # Each camera in the room has its own motion reference and face tracks
+    camera_key = (session_id, str(camera_id or '')[:64])
+
+    # Static scene (lecture in progress): hand back the last detections
+    # without running any models
+    gate = get_motion_gate(camera_key)
+    if not gate.check(frame.detect):
+        stats = {'faces': len(gate.detections), 'embedded': 0, 'reused': len(gate.detections), 'low_quality': 0}
+        return {'success': True, 'new_students': [], 'detected_faces': gate.detections,
+                'motion_skipped': True, 'stats': stats}
 
     # 2. Get/Cache Embeddings
-    current_student_count = Student.query.count()
-    
-    # Refresh cache if session missing OR student count changed (handling new registrations)
-    should_refresh = False
+    # Build (or map from the shared store) on first frame; afterwards only
+    # apply FaceData changes as a delta
     if session_id not in active_sessions_cache:
-        should_refresh = True
-    else:
-        # Check if cache is stale
-        cached_count = len(active_sessions_cache[session_id]['map'])
-        if cached_count != current_student_count:
-            print(f"DEBUG: Cache Stale! (Cached: {cached_count}, DB: {current_student_count}). Refreshing...")
-            should_refresh = True
-
-    if should_refresh:
         print(f"DEBUG: Building Cache for Session {session_id}")
-        students = Student.query.all() 
-        known_embeddings = []
-        student_map = {}
-        
-        for i, student in enumerate(students):
-            if student.face_data:
-                # Ensure embedding is list
-                emb = student.face_data.get_embedding()
-                if emb:
-                    known_embeddings.append(emb)
-                    student_map[len(known_embeddings)-1] = student
-        
-        active_sessions_cache[session_id] = {
-            'embeddings': known_embeddings,
-            'map': student_map
-        }
+        active_sessions_cache[session_id] = build_session_galleries(session)
+    changed_ids = active_sessions_cache[session_id].sync(gallery_version.current())
+    if changed_ids:
+        # Identities carried by tracks may refer to replaced or removed faces
+        forget_track_identities(session_id, changed_ids)
     
     # Retrieve from cache
-    cache = active_sessions_cache[session_id]
-    known_embeddings = cache['embeddings']
-    student_map = cache['map']
+    galleries = active_sessions_cache[session_id]
 
-    if not known_embeddings:
+    if not len(galleries) and not galleries.fallback_scope:
          return {'success': True, 'new_students': []} 
 
-    # 3. Detect & Recognize (Optimized)
+    # 3. Detect, Track & Recognize (Optimized)
     newly_marked = []
     
     try:
@@ -157,102 +368,120 @@ def process_frame():
         
         # Use 'ssd' - Verified WORKING on TF 2.10.
         # This provides robust multi-face detection without the crashes of RetinaFace/MediaPipe.
-        target_objs = DeepFace.represent(
-            frame, 
-            model_name="VGG-Face", 
-            detector_backend="ssd", 
-            enforce_detection=False,
-            align=True
-        )
+        try:
+            areas = run_inference('locate', frame.detect, 'ssd')
+        except InferenceUnavailable as e:
+            print(f"Inference Unavailable: {e}")
+            return {'success': False, 'message': 'Recognition busy, retrying', 'retry': True}, 503
 
         # Log how many faces found
-        if isinstance(target_objs, list):
-            print(f"DEBUG: SSD detected {len(target_objs)} face(s).")
+        print(f"DEBUG: SSD detected {len(areas)} face(s).")
+        areas = [frame.to_full(area) for area in areas]
+        if not areas:
+            gate.update([])
         
         # Check if any faces detected
-        if target_objs and isinstance(target_objs, list):
+        if areas:
             
             detected_faces_list = []
             newly_marked = []
-            attendance_buffer = []
+            attendance_buffer = {}  # student_id -> Attendance row
+            marked_info = {}  # student_id -> entry for 'new_students'
+            marked = marked_students(session_id)
 
-            for i, face_obj in enumerate(target_objs):
+            # ------------- TRACKING -------------
+            # Faces already identified on earlier frames keep their identity;
+            # only new, unknown or due-for-reverification tracks are embedded
+            tracker = get_session_tracker(camera_key)
+            tracks = tracker.update([[a['x'], a['y'], a['w'], a['h']] for a in areas])
+            pending = [i for i, track in enumerate(tracks) if tracker.needs_embedding(track)]
+            reused = len(tracks) - len(pending)
+
+            # ------------- QUALITY GATE -------------
+            # Tiny, blurred, badly lit or turned-away faces would not match anyway.
+            # Their tracks stay pending, so they are retried on a later frame.
+            low_quality = {}
+            if pending:
+                quality_ok, reasons = QualityGate.from_config(current_app.config).check(
+                    frame.full, [areas[i] for i in pending])
+                for i, reason in zip(pending, reasons):
+                    if reason:
+                        low_quality[i] = reason
+                pending = [i for i, ok in zip(pending, quality_ok) if ok]
+            print(f"DEBUG: Embedding {len(pending)} face(s), {reused} reused from tracks, "
+                  f"{len(low_quality)} deferred for quality.")
+
+            # ------------- RECOGNITION -------------
+            identified = set()  # Faces whose track got a new identity this frame
+            if pending:
+                # Cut from the full-resolution frame: back-row faces keep their detail
+                crops = crop_faces(frame.full, [areas[i] for i in pending])
                 try:
-                    target_embedding = face_obj.get("embedding")
-                    facial_area = face_obj.get("facial_area", {})
-                    
-                    if not target_embedding:
-                        continue
+                    embeddings = run_inference('embed', crops)
+                except InferenceUnavailable as e:
+                    print(f"Inference Unavailable: {e}")
+                    return {'success': False, 'message': 'Recognition busy, retrying', 'retry': True}, 503
 
-                    # ------------- RECOGNITION -------------
-                    best_match_idx = -1
-                    min_dist = 100
-                    
-                    # Cosine calc
-                    target_vec = np.array(target_embedding)
-                    norm_target = np.linalg.norm(target_vec)
-                    
-                    for idx, known_emb in enumerate(known_embeddings):
-                        known_vec = np.array(known_emb)
-                        norm_known = np.linalg.norm(known_vec)
-                        
-                        cosine_sim = np.dot(known_vec, target_vec) / (norm_known * norm_target)
-                        cosine_dist = 1 - cosine_sim
-                        
-                        if cosine_dist < min_dist:
-                            min_dist = cosine_dist
-                            best_match_idx = idx
-                    
-                    # Log Top Matches for Debugging
-                    # We can't easily sort without storing them all, so we just log the Best one clearly
-                    # or strictly log if it was close.
+                # One batched similarity call for every face that needs it
+                matches = galleries.match(embeddings, threshold)
+
+                for i, match in zip(pending, matches):
+                    # Log the best match distance even if unknown
+                    matched_name = match['student']['name'] if match['student'] else "None"
+                    runner_up = match['second']['name'] if match['second'] else "None"
+                    print(f"FACE {i}: Best Dist={match['dist']:.4f} to {matched_name} [{match['scope']}], "
+                          f"2nd={match['second_dist']:.4f} to {runner_up} (Thresh={threshold})")
                     
+                    # Diagnostic: If dist is high, print why
+                    if match['dist'] >= threshold:
+                        print("    -> UNKNOWN. Closest match was not good enough.")
+
+                    if tracker.record(tracks[i], match['student'], match['dist'], threshold) and tracks[i].identity:
+                        identified.add(i)
+
+            for i, track in enumerate(tracks):
+                try:
                     # ------------- MATCH LOGIC -------------
                     face_data = {
-                        'box': facial_area,
+                        'box': areas[i],
                         'name': 'Unknown',
-                        'match': False
+                        'match': False,
+                        'track_id': track.id
                     }
-                    
-                    # Log the best match distance even if unknown
-                    matched_name = student_map[best_match_idx].user.name if best_match_idx != -1 else "None"
-                    print(f"FACE {i}: Best Dist={min_dist:.4f} to {matched_name} (Thresh={threshold})")
-                    
-                    # Diagnostic: If dist is high, print why
-                    if min_dist >= threshold:
-                        print("    -> UNKNOWN. Closest match was not good enough.")
+                    if i in low_quality:
+                        face_data['quality'] = low_quality[i]
 
-                    if min_dist < threshold and best_match_idx != -1:
-                        # Match Found
-                        student = student_map[best_match_idx]
-                        face_data['name'] = student.user.name
+                    if track.identity:
+                        # Match Found (this frame, or carried over by the track)
+                        student = track.identity
+                        min_dist = track.dist
+                        face_data['name'] = student['name']
                         face_data['match'] = True
-                        print(f"  -> Match: {student.user.name}")
-                        
-                        # Check DB (is already marked?)
-                        # Optimization: Check buffer first to avoid double-add in same frame
-                        in_buffer = any(a.student_id == student.id for a in attendance_buffer)
-                        
-                        if not in_buffer:
-                            existing = Attendance.query.filter_by(student_id=student.id, session_id=session.id).first()
-                            if not existing:
-                                confidence_score = (1 - min_dist) * 100
-                                new_attendance = Attendance(
-                                    student_id=student.id, 
-                                    session_id=session.id, 
-                                    status='Present',
-                                    confidence=confidence_score,
-                                    recognition_time=0.5
-                                )
-                                attendance_buffer.append(new_attendance)
-                                
-                                newly_marked.append({
-                                    'name': student.user.name,
-                                    'roll_no': student.roll_no,
-                                    'time': datetime.now().strftime("%H:%M:%S")
-                                })
-                            else:
+                        if i in identified:
+                            print(f"  -> Match: {student['name']}")
+
+                        # Already marked? Answered from the session's in-memory set
+                        # (no SELECT); buffer check avoids double-add in same frame.
+                        # Checked on every frame, not only when the identity changes,
+                        # so a row the writer gave up on (forget_marked) is retried
+                        # while the student is still in view
+                        if student['id'] in marked or student['id'] in attendance_buffer:
+                            if i in identified:
                                 print(f"  -> Already marked within session.")
+                        else:
+                            confidence_score = (1 - min_dist) * 100
+                            attendance_buffer[student['id']] = {
+                                'student_id': student['id'],
+                                'session_id': session_id,
+                                'status': 'Present',
+                                'confidence': confidence_score,
+                                'recognition_time': 0.5
+                            }
+                            marked_info[student['id']] = {
+                                'name': student['name'],
+                                'roll_no': student['roll_no'],
+                                'time': datetime.now().strftime("%H:%M:%S")
+                            }
                     
                     detected_faces_list.append(face_data)
                 
@@ -262,15 +491,39 @@ def process_frame():
 
             # ------------- BATCH COMMIT -------------
             if attendance_buffer:
-                try:
-                    db.session.add_all(attendance_buffer)
-                    db.session.commit()
-                    print(f"DEBUG: Committed {len(attendance_buffer)} new attendance records.")
-                except Exception as db_e:
-                    print(f"Database Commit Error: {db_e}")
-                    db.session.rollback()
-
-            return {'success': True, 'new_students': newly_marked, 'detected_faces': detected_faces_list}
+                writer = get_writer()
+                if writer:
+                    # Write-behind: queued for the background writer's next batch, so
+                    # this frame never waits on the DB write lock
+                    writer.add_attendance(attendance_buffer.values())
+                    remember_marked(session_id, attendance_buffer.keys())
+                    newly_marked = list(marked_info.values())
+                    print(f"DEBUG: Queued {len(attendance_buffer)} new attendance records.")
+                else:
+                    # INSERT ... ON CONFLICT DO NOTHING: if another worker marked the
+                    # same student meanwhile, the unique constraint drops our row
+                    try:
+                        inserted = insert_attendance(attendance_buffer.values())
+                        db.session.commit()
+                        publish_attendance(inserted)
+                        inserted_ids = {student_id for student_id, _ in inserted}
+                        remember_marked(session_id, attendance_buffer.keys())
+                        newly_marked = [marked_info[sid] for sid in attendance_buffer if sid in inserted_ids]
+                        print(f"DEBUG: Committed {len(inserted_ids)} new attendance records.")
+                    except Exception as db_e:
+                        print(f"Database Commit Error: {db_e}")
+                        db.session.rollback()
+
+            gate.update(detected_faces_list)
+            # How much model work this frame needed vs. avoided
+            stats = {
+                'faces': len(tracks),
+                'embedded': len(pending),
+                'reused': reused,
+                'low_quality': len(low_quality),
+                'low_quality_reasons': sorted(set(low_quality.values()))
+            }
+            return {'success': True, 'new_students': newly_marked, 'detected_faces': detected_faces_list, 'stats': stats}
 
     except Exception as e:
         print(f"Recognition Error: {e}")
@@ -0,0 +1,108 @@
+import math
+
+import cv2
+import numpy as np
+
+from app.inference import EMBEDDING_INPUT_SIZE, prepare_crop
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale (DCT scaling), which is
+# much cheaper than a full decode followed by a resize
+_REDUCED_DECODE = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+class FrameSource:
+    """One uploaded frame at two resolutions.
+
+    `detect` is a downscaled level for the face detector (and motion gate);
+    `full` is the original resolution that face crops are cut from. For
+    JPEG uploads the full image is only decoded if some face actually needs
+    an embedding.
+    """
+
+    def __init__(self, detect, scale, full=None, data=None):
+        self.detect = detect
+        self.scale = scale  # full-resolution pixels per detect-level pixel
+        self._full = full
+        self._data = data
+
+    @classmethod
+    def from_jpeg(cls, data, downscale=1):
+        """Decodes an encoded upload; returns None if it is not an image."""
+        buf = np.frombuffer(data, np.uint8)
+        flag = _REDUCED_DECODE.get(downscale)
+        if flag is None:
+            frame = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            return cls.from_image(frame, downscale) if frame is not None else None
+        small = cv2.imdecode(buf, flag)
+        if small is None:
+            return None
+        return cls(small, float(downscale), data=buf)
+
+    @classmethod
+    def from_image(cls, frame, downscale=1):
+        """Wraps an already-decoded BGR frame."""
+        if downscale <= 1:
+            return cls(frame, 1.0, full=frame)
+        h, w = frame.shape[:2]
+        size = (max(1, int(round(w / downscale))), max(1, int(round(h / downscale))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cls(small, w / small.shape[1], full=frame)
+
+    @property
+    def full(self):
+        if self._full is None:
+            self._full = cv2.imdecode(self._data, cv2.IMREAD_COLOR)
+        return self._full
+
+    def to_full(self, area):
+        """Maps a detector facial_area from the detect level to full-resolution pixels."""
+        scaled = {key: int(round(area[key] * self.scale)) for key in ('x', 'y', 'w', 'h')}
+        for eye in ('left_eye', 'right_eye'):
+            if area.get(eye) is not None:
+                scaled[eye] = tuple(int(round(v * self.scale)) for v in area[eye])
+        return scaled
+
+
+def crop_faces(frame, areas, target_size=EMBEDDING_INPUT_SIZE):
+    """Stacks eye-aligned crops of `areas` from `frame`, sized for the embedding model."""
+    if not areas:
+        return np.empty((0,) + tuple(target_size) + (3,), dtype=np.float32)
+    return np.stack([crop_aligned(frame, area, target_size) for area in areas])
+
+
+def crop_aligned(frame, area, target_size=EMBEDDING_INPUT_SIZE):
+    """Cuts one face out of a BGR frame, rotated so the eyes are level.
+
+    Only a margin around the face is rotated, not the whole frame. The
+    result matches DeepFace's preprocessing (see prepare_crop).
+    """
+    frame_h, frame_w = frame.shape[:2]
+    x, y, w, h = area['x'], area['y'], area['w'], area['h']
+    x, y = max(0, x), max(0, y)
+    w, h = max(1, min(w, frame_w - x)), max(1, min(h, frame_h - y))
+
+    angle = 0.0
+    left, right = area.get('left_eye'), area.get('right_eye')
+    if left and right:
+        (x1, y1), (x2, y2) = sorted([tuple(left), tuple(right)])
+        angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+
+    if abs(angle) > 1.0:
+        margin = max(w, h) // 2
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        x3, y3 = min(frame_w, x + w + margin), min(frame_h, y + h + margin)
+        region = frame[y0:y3, x0:x3]
+        centre = ((x1 + x2) / 2.0 - x0, (y1 + y2) / 2.0 - y0)
+        rotation = cv2.getRotationMatrix2D(centre, angle, 1.0)
+        region = cv2.warpAffine(region, rotation, (region.shape[1], region.shape[0]),
+                                flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        face = region[y - y0:y - y0 + h, x - x0:x - x0 + w]
+    else:
+        face = frame[y:y + h, x:x + w]
+
+    # prepare_crop expects DeepFace's RGB [0, 1] faces
+    return prepare_crop(face[:, :, ::-1].astype(np.float32) / 255.0, target_size)
@@ -0,0 +1,484 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SASession
+from app import db
+from app.models import Student, FaceData, User, GalleryChange
+from app.gallery_store import GalleryStore
+
+# Widening scopes for faces that have no match in their class gallery
+FALLBACK_SCOPES = ('department', 'campus')
+
+
+class Gallery:
+    """In-memory face gallery for a live attendance session.
+
+    All known embeddings are held as one L2-normalized float32 matrix so a whole
+    frame can be scored with a single matrix product instead of a Python loop.
+    """
+
+    def __init__(self, embeddings, students):
+        # students: list of dicts ({'id', 'name', 'roll_no'}) aligned with the rows
+        self.students = list(students)
+        if len(embeddings):
+            self.matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        else:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+
+    @classmethod
+    def from_normalized(cls, matrix, students):
+        """Wraps an already-normalized matrix (e.g. a read-only memmap) without copying."""
+        gallery = cls([], students)
+        gallery.matrix = matrix
+        return gallery
+
+    def __len__(self):
+        return len(self.students)
+
+    def with_delta(self, upserts, removed_ids):
+        """A new Gallery with the changes applied, in place of a full rebuild.
+
+        upserts: list of (student info dict, embedding) to add or replace.
+        removed_ids: student ids to drop from the gallery.
+        Returns (gallery, old row indices kept, in order); upserts are appended
+        after them. This gallery is left untouched, since other request
+        threads may be matching against it: callers swap the result in with
+        one assignment.
+        """
+        removed_ids = set(removed_ids) | {info['id'] for info, _ in upserts}
+        keep = [i for i, info in enumerate(self.students) if info['id'] not in removed_ids]
+        matrix = self.matrix[keep] if len(keep) != len(self.students) else self.matrix
+        students = [self.students[i] for i in keep]
+
+        if upserts:
+            new_rows = normalize_rows(np.asarray([emb for _, emb in upserts], dtype=np.float32))
+            matrix = np.vstack([matrix, new_rows]) if students else new_rows
+            students.extend(info for info, _ in upserts)
+        return Gallery.from_normalized(matrix, students), keep
+
+    def match(self, targets):
+        """Scores a batch of face embeddings against the gallery.
+
+        Returns four arrays of length len(targets): best row index, best cosine
+        distance, second-best row index and second-best cosine distance.
+        Missing matches are reported as index -1 and distance inf.
+        """
+        queries = normalize_rows(np.asarray(targets, dtype=np.float32))
+        n_faces = queries.shape[0]
+
+        best_idx = np.full(n_faces, -1, dtype=np.int64)
+        second_idx = np.full(n_faces, -1, dtype=np.int64)
+        best_dist = np.full(n_faces, np.inf, dtype=np.float32)
+        second_dist = np.full(n_faces, np.inf, dtype=np.float32)
+
+        n_known = len(self)
+        if n_faces == 0 or n_known == 0:
+            return best_idx, best_dist, second_idx, second_dist
+
+        # (faces x known) cosine similarity in one BLAS call
+        sims = queries @ self.matrix.T
+        rows = np.arange(n_faces)
+
+        if n_known == 1:
+            best_idx[:] = 0
+            best_dist[:] = 1.0 - sims[:, 0]
+            return best_idx, best_dist, second_idx, second_dist
+
+        # Top-2 without a full sort: partition, then order the two survivors
+        top2 = np.argpartition(-sims, 1, axis=1)[:, :2]
+        top2_sims = sims[rows[:, None], top2]
+        order = np.argsort(-top2_sims, axis=1)
+        top2 = np.take_along_axis(top2, order, axis=1)
+        top2_sims = np.take_along_axis(top2_sims, order, axis=1)
+
+        best_idx[:] = top2[:, 0]
+        second_idx[:] = top2[:, 1]
+        best_dist[:] = 1.0 - top2_sims[:, 0]
+        second_dist[:] = 1.0 - top2_sims[:, 1]
+        return best_idx, best_dist, second_idx, second_dist
+
+
+def normalize_rows(matrix):
+    """L2-normalizes each row of a 2-D float32 array (zero rows stay zero)."""
+    matrix = np.atleast_2d(matrix).astype(np.float32, copy=False)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def gallery_query(class_name=None, fallback_scope=None, departments=()):
+    """Single joined Student/FaceData/User query for one gallery scope.
+
+    With only class_name set this is the class roster. The fallback scopes do
+    not depend on the class, so every class shares them: 'department' selects
+    the students of `departments`, 'campus' everyone. They include the class
+    itself; its students already scored the same distance in the class
+    gallery, so they never replace a class result.
+    """
+    query = db.session.query(FaceData, Student.id, Student.roll_no, User.name) \
+        .join(Student, FaceData.student_id == Student.id) \
+        .join(User, Student.user_id == User.id)
+
+    if fallback_scope is None:
+        if class_name is not None:
+            query = query.filter(Student.class_name == class_name)
+        return query
+
+    if fallback_scope == 'department':
+        query = query.filter(Student.department.in_(list(departments)))
+    return query
+
+
+def class_departments(class_name):
+    """Departments of a class's students: its 'department' fallback scope."""
+    rows = db.session.query(Student.department).filter(Student.class_name == class_name).distinct()
+    return tuple(sorted(department for (department,) in rows))
+
+
+def _gallery_rows(query):
+    rows = []
+    for face_data, student_id, roll_no, name in query:
+        emb = face_data.get_embedding_array()
+        if emb is not None and emb.size:
+            rows.append(({'id': student_id, 'name': name, 'roll_no': roll_no}, emb))
+    return rows
+
+
+def load_gallery(class_name=None, fallback_scope=None, departments=()):
+    """Builds a Gallery from the rows selected by gallery_query()."""
+    rows = _gallery_rows(gallery_query(class_name, fallback_scope, departments))
+    return Gallery([emb for _, emb in rows], [info for info, _ in rows])
+
+
+def refresh_gallery(gallery, changed_ids, class_name=None, fallback_scope=None, departments=()):
+    """Re-reads only the changed students and returns the gallery with them applied.
+
+    `gallery` may be a Gallery or an IVFIndex; it is not modified. Changed
+    students no longer in scope (deleted, moved class, face removed) are
+    dropped. Returns (new gallery, upserted count, removed count).
+    """
+    query = gallery_query(class_name, fallback_scope, departments).filter(Student.id.in_(changed_ids))
+    upserts = _gallery_rows(query)
+    found = {info['id'] for info, _ in upserts}
+    refreshed, _ = gallery.with_delta(upserts, set(changed_ids) - found)
+    return refreshed, len(upserts), len(set(changed_ids) - found)
+
+
+class GalleryVersion:
+    """Cheap, per-process view of the latest GalleryChange id.
+
+    Committing a gallery change writes its id to GALLERY_VERSION_FILE, so a
+    frame only costs an os.stat() (and a tiny read when it moved). The DB is
+    read at most every GALLERY_VERSION_POLL_SECONDS to catch writers on other
+    hosts; a missing stamp is seeded from the DB on the first read.
+    """
+
+    def __init__(self):
+        self.latest = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def current(self):
+        path = _stamp_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+
+        now = time.monotonic()
+        poll = current_app.config.get('GALLERY_VERSION_POLL_SECONDS', 30)
+        stamped = _read_stamp(path) if mtime is not None and mtime != self._mtime else None
+        if stamped is not None:
+            if self.latest is None:
+                # First look in this process: trust the stamp until the next poll
+                self._checked_at = now
+            self.latest = max(self.latest or 0, stamped)
+        elif self.latest is None or mtime != self._mtime or now - self._checked_at >= poll:
+            self.latest = max(self.latest or 0, latest_change_id())
+            self._checked_at = now
+            if mtime is None and path:
+                # No stamp yet (fresh deploy): write one so later frames skip the DB
+                _write_stamp(path, self.latest)
+        self._mtime = mtime
+        return self.latest
+
+
+def latest_change_id():
+    return db.session.query(db.func.max(GalleryChange.id)).scalar() or 0
+
+
+def changed_students(since_id):
+    """Student ids touched after change `since_id`, and the newest change id."""
+    rows = db.session.query(GalleryChange.id, GalleryChange.student_id) \
+        .filter(GalleryChange.id > since_id).all()
+    if not rows:
+        return set(), since_id
+    return {student_id for _, student_id in rows}, max(change_id for change_id, _ in rows)
+
+
+def _stamp_path():
+    return current_app.config.get('GALLERY_VERSION_FILE')
+
+
+def _read_stamp(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return None
+
+
+@event.listens_for(SASession, 'after_commit')
+def _write_version_stamp(session):
+    version = session.info.pop('gallery_version', None)
+    if version is None or not has_app_context():
+        return
+    path = _stamp_path()
+    if path:
+        _write_stamp(path, version)
+
+
+def _write_stamp(path, version):
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        version = max(version, _read_stamp(path) or 0)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.gallery-version-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: Could not write gallery version stamp: {e}")
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_version_stamp(session):
+    session.info.pop('gallery_version', None)
+
+
+gallery_version = GalleryVersion()
+
+
+class ScopedGallery:
+    """One gallery scope (a class, or a shared fallback scope) kept at a known version.
+
+    With a GalleryStore configured the matrix is loaded from, and published to,
+    the host-wide memory-mapped store, so only the first worker on a host builds
+    it from the DB. Large scopes can additionally be searched through an IVF
+    index (ANN_ENABLED, see app/ann_index.py).
+
+    Request threads match against `searcher` while another thread may sync:
+    galleries and indexes are never modified once visible, only replaced by
+    a single attribute assignment, and syncs are serialized by a lock.
+    """
+
+    def __init__(self, class_name, fallback_scope=None, store=None, rebuild=False, departments=()):
+        self.class_name = class_name
+        self.fallback_scope = fallback_scope
+        self.departments = tuple(departments)
+        self.store = store
+        self.key = GalleryStore.key(class_name, fallback_scope, self.departments)
+        self.index = None
+        self._sync_lock = threading.Lock()
+
+        shared = store.load(self.key) if store and not rebuild else None
+        if shared:
+            matrix, students, self.version = shared
+            self.gallery = Gallery.from_normalized(matrix, students)
+        else:
+            # Read the version before the rows so a concurrent change is re-applied, not lost
+            self.version = latest_change_id()
+            self.gallery = load_gallery(class_name, fallback_scope, self.departments)
+            self._publish()
+        self._attach_index(rebuild)
+
+    @property
+    def searcher(self):
+        """The object to match against: the IVF index if one is attached, else the exact gallery."""
+        return self.index if self.index is not None else self.gallery
+
+    def sync(self, latest_version):
+        """Brings the gallery up to latest_version; returns the ids of the students that changed."""
+        if latest_version <= self.version:
+            return set()
+        with self._sync_lock:
+            if latest_version <= self.version:
+                return set()  # Another thread of this session applied it meanwhile
+            return self._sync(latest_version)
+
+    def _sync(self, latest_version):
+        # Another worker may already have published this version
+        shared = self.store.load(self.key) if self.store else None
+        if shared and shared[2] >= latest_version:
+            matrix, students, version = shared
+            changed_ids, _ = changed_students(self.version)
+            self.gallery = Gallery.from_normalized(matrix, students)
+            self._attach_index()
+            self.version = version
+            return changed_ids
+
+        changed_ids, newest = changed_students(self.version)
+        if changed_ids:
+            refreshed, added, removed = refresh_gallery(self.searcher, changed_ids, self.class_name,
+                                                        self.fallback_scope, self.departments)
+            if self.index is not None:
+                # The index carries its (repacked) gallery: swap the index last
+                self.gallery = refreshed.gallery
+                self.index = refreshed
+            else:
+                self.gallery = refreshed
+            print(f"DEBUG: Gallery delta for {self.key}: "
+                  f"{added} upserted, {removed} removed (v{self.version} -> v{newest})")
+        self.version = max(newest, latest_version)
+        if changed_ids:
+            self._publish()
+            self._save_index()
+        return changed_ids
+
+    def _publish(self):
+        if not self.store:
+            return
+        try:
+            matrix = self.store.publish(self.key, self.gallery.matrix, self.gallery.students, self.version)
+            self.gallery = Gallery.from_normalized(matrix, self.gallery.students)
+            if self.index is not None:
+                self.index = self.index.with_gallery(self.gallery)
+        except OSError as e:
+            print(f"WARNING: Could not publish gallery {self.key}: {e}")
+
+    def _index_path(self):
+        return os.path.join(current_app.config['ANN_INDEX_DIR'], f"{self.key}.ivf.npz")
+
+    def _attach_index(self, rebuild=False):
+        config = current_app.config
+        self.index = None
+        if not config.get('ANN_ENABLED') or len(self.gallery) < config.get('ANN_MIN_GALLERY_SIZE', 20000):
+            return
+
+        from app.ann_index import IVFIndex
+        nprobe = config.get('ANN_NPROBE', 8)
+        loaded = None if rebuild else IVFIndex.load(self._index_path(), self.gallery, nprobe)
+        if loaded:
+            self.index, saved_version = loaded
+        else:
+            print(f"DEBUG: Building IVF index for {self.key} ({len(self.gallery)} faces)")
+            self.index = IVFIndex.build(self.gallery, n_lists=config.get('ANN_LISTS'), nprobe=nprobe)
+            saved_version = None
+
+        # The index stores the gallery list by list; publish that order so
+        # workers map it (later workers find it already packed, copy-free)
+        if self.index.gallery is not self.gallery:
+            self.gallery = self.index.gallery
+            self._publish()
+        if saved_version != self.version:
+            self._save_index()
+
+    def _save_index(self):
+        if self.index is None:
+            return
+        try:
+            self.index.save(self._index_path(), self.version)
+        except OSError as e:
+            print(f"WARNING: Could not save IVF index {self.key}: {e}")
+
+
+# Fallback galleries of this process, shared by every session whose class
+# maps to the same scope: { store key: ScopedGallery }
+_shared_fallbacks = {}
+_shared_fallbacks_lock = threading.Lock()
+
+
+def shared_fallback(fallback_scope, departments=(), store=None, rebuild=False):
+    """The process-wide fallback gallery for a scope, built on first use."""
+    key = GalleryStore.key(None, fallback_scope, departments)
+    with _shared_fallbacks_lock:
+        gallery = _shared_fallbacks.get(key)
+        if gallery is None or rebuild:
+            gallery = ScopedGallery(None, fallback_scope, store, rebuild, departments)
+            _shared_fallbacks[key] = gallery
+    return gallery
+
+
+class SessionGalleries:
+    """Class-scoped gallery for one session, plus an optional wider fallback.
+
+    The fallback gallery is only loaded the first time a face fails to match
+    the class gallery, and is shared with other classes of the same scope.
+    """
+
+    def __init__(self, class_name, fallback_scope=None, store=None, rebuild=False):
+        if fallback_scope not in (None,) + FALLBACK_SCOPES:
+            raise ValueError(f"Unknown gallery fallback scope: {fallback_scope}")
+        self.class_name = class_name
+        self.fallback_scope = fallback_scope
+        self.store = store
+        self.rebuild = rebuild
+        self._primary = ScopedGallery(class_name, store=store, rebuild=rebuild)
+        self._fallback = None
+
+    def __len__(self):
+        return len(self.primary)
+
+    @property
+    def primary(self):
+        return self._primary.gallery
+
+    @property
+    def fallback(self):
+        if self.fallback_scope and self._fallback is None:
+            print(f"DEBUG: Loading '{self.fallback_scope}' fallback gallery for class {self.class_name}")
+            departments = class_departments(self.class_name) if self.fallback_scope == 'department' else ()
+            self._fallback = shared_fallback(self.fallback_scope, departments, self.store, self.rebuild)
+        return self._fallback.gallery if self._fallback else None
+
+    @property
+    def version(self):
+        return self._primary.version
+
+    def sync(self, latest_version):
+        """Applies GalleryChange rows newer than this gallery as a delta.
+
+        Returns the ids of the students whose faces changed, so tracks holding
+        one of them can be re-identified.
+        """
+        changed = self._primary.sync(latest_version)
+        if self._fallback is not None:
+            changed = changed | self._fallback.sync(latest_version)
+        return changed
+
+    def match(self, targets, threshold):
+        """Matches a batch of embeddings, widening the search for unmatched faces.
+
+        Returns one dict per target: 'student' (info dict or None), 'dist',
+        'second' (runner-up info dict or None), 'second_dist' and 'scope'.
+        """
+        targets = np.asarray(targets, dtype=np.float32)
+        results = _collect(self._primary.searcher, targets, 'class')
+
+        unmatched = [i for i, r in enumerate(results) if r['dist'] >= threshold]
+        if unmatched and self.fallback_scope:
+            if len(self.fallback):
+                wider = _collect(self._fallback.searcher, targets[unmatched], self.fallback_scope)
+                for i, res in zip(unmatched, wider):
+                    if res['dist'] < results[i]['dist']:
+                        results[i] = res
+        return results
+
+
+def _collect(gallery, targets, scope):
+    best_idx, best_dist, second_idx, second_dist = gallery.match(targets)
+    results = []
+    for i in range(len(targets)):
+        results.append({
+            'student': gallery.students[best_idx[i]] if best_idx[i] != -1 else None,
+            'dist': float(best_dist[i]),
+            'second': gallery.students[second_idx[i]] if second_idx[i] != -1 else None,
+            'second_dist': float(second_dist[i]),
+            'scope': scope
+        })
+    return results
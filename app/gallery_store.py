@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from flask import current_app
+
+
+class GalleryStore:
+    """Host-wide, memory-mapped gallery files shared by all gunicorn workers.
+
+    Each gallery is published as an immutable `<key>@<version>.npy` matrix plus
+    a `<key>.json` manifest naming it. Workers np.load() the matrix with
+    mmap_mode='r', so every process maps the same page-cache pages instead of
+    holding a private copy. Publishing writes to a temp file and os.replace()s
+    the manifest, so readers only ever see a complete gallery.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(class_name, scope=None, departments=()):
+        """File name stem of a gallery: a class, or a fallback scope shared by classes."""
+        if scope == 'campus':
+            return 'campus'
+        # Class and department names are free text; hash them into a safe file name
+        name = ','.join(sorted(departments)) if scope == 'department' else str(class_name)
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
+        return f"{scope or 'class'}-{digest}"
+
+    def _manifest_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self, key):
+        """Maps the published gallery read-only.
+
+        Returns (normalized matrix, student info list, version) or None.
+        """
+        manifest = self._read_manifest(key)
+        if not manifest:
+            return None
+        try:
+            matrix = np.load(os.path.join(self.root, manifest['matrix']), mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Gallery store file for {key} unreadable ({e}). Rebuilding from DB.")
+            return None
+        return matrix, manifest['students'], manifest['version']
+
+    def publish(self, key, matrix, students, version):
+        """Atomically replaces the stored gallery and returns its matrix memory-mapped."""
+        matrix_name = f"{key}@{version}.npy"
+        matrix_path = os.path.join(self.root, matrix_name)
+        self._atomic_write(matrix_path, lambda f: np.save(f, np.ascontiguousarray(matrix, dtype=np.float32)))
+
+        manifest = {'version': version, 'matrix': matrix_name, 'students': students}
+        self._atomic_write(self._manifest_path(key), lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        self._remove_stale(key, version)
+
+        return np.load(matrix_path, mmap_mode='r')
+
+    def _read_manifest(self, key):
+        try:
+            with open(self._manifest_path(key), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _atomic_write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _remove_stale(self, key, version):
+        # Only older versions: a concurrent publisher may be about to point the
+        # manifest at a newer one. Unlinking a file another worker still maps is
+        # safe on POSIX; the mapping stays valid until that worker remaps.
+        prefix = f"{key}@"
+        for name in os.listdir(self.root):
+            if not (name.startswith(prefix) and name.endswith('.npy')):
+                continue
+            try:
+                if int(name[len(prefix):-len('.npy')]) < version:
+                    os.unlink(os.path.join(self.root, name))
+            except (ValueError, OSError):
+                pass
+
+
+_stores = {}
+
+
+def get_gallery_store():
+    """Store for GALLERY_STORE_DIR, or None when the shared store is disabled."""
+    root = current_app.config.get('GALLERY_STORE_DIR')
+    if not root:
+        return None
+    if root not in _stores:
+        _stores[root] = GalleryStore(root)
+    return _stores[root]
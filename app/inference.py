@@ -0,0 +1,428 @@
+import os
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import numpy as np
+from flask import current_app
+
+# Face model state for this process. 'cold' -> 'loading' -> 'ready' (or 'error')
+_model_state = {
+    'status': 'cold',
+    'error': None,
+    'load_seconds': None,
+    'loaded_at': None,
+    'detectors': []
+}
+_model_lock = threading.Lock()
+
+EMBEDDING_MODEL = "VGG-Face"
+# VGG-Face input (h, w), for code that crops faces without loading the model
+EMBEDDING_INPUT_SIZE = (224, 224)
+
+
+class InferenceUnavailable(Exception):
+    """The inference service could not take or finish the request in time."""
+
+
+class InferenceBusy(InferenceUnavailable):
+    """The service's bounded queue is full."""
+
+
+class InferenceTimeout(InferenceUnavailable):
+    """No result within INFERENCE_TIMEOUT seconds."""
+
+
+class InferenceError(Exception):
+    """The model raised inside the service."""
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Caps math-library thread pools for the process that runs the models.
+
+    Must run before TensorFlow is imported to take full effect; set one value
+    per process so several model processes partition the cores rather than
+    oversubscribing them.
+    """
+    if intra_op:
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+            os.environ[var] = str(intra_op)
+    if inter_op:
+        os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op)
+    try:
+        import tensorflow as tf
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except ImportError:
+        pass
+    except RuntimeError as e:
+        # TensorFlow already ran an op in this process: the caps no longer apply
+        print(f"WARNING: Could not cap TensorFlow threads ({e}); configure them before loading models.")
+    try:
+        import cv2
+        if intra_op:
+            cv2.setNumThreads(intra_op)
+    except ImportError:
+        pass
+
+
+def warm_up_models(detectors=('ssd',)):
+    """Imports DeepFace and builds VGG-Face plus the given detectors once per process.
+
+    Runs TensorFlow ops, so it must happen in the process that serves
+    inference and never in a parent that forks afterwards (see
+    warm_up_worker). Otherwise the first frame or enrollment pays for it lazily.
+    """
+    with _model_lock:
+        if _model_state['status'] == 'ready':
+            return True
+
+        _model_state['status'] = 'loading'
+        start = time.time()
+        try:
+            print("DEBUG: Warming up face models...")
+            from deepface import DeepFace
+            DeepFace.build_model(EMBEDDING_MODEL)
+
+            # Detectors are built and cached on first use; run each on a blank image
+            blank = np.zeros((224, 224, 3), dtype=np.uint8)
+            for backend in detectors:
+                DeepFace.extract_faces(blank, detector_backend=backend, enforce_detection=False)
+                print(f"DEBUG: Detector '{backend}' loaded.")
+
+            _model_state.update({
+                'status': 'ready',
+                'error': None,
+                'load_seconds': round(time.time() - start, 2),
+                'loaded_at': time.time(),
+                'detectors': list(detectors)
+            })
+            print(f"DEBUG: Face models ready in {_model_state['load_seconds']}s")
+            return True
+        except Exception as e:
+            print(f"Model Warm-up Error: {e}")
+            traceback.print_exc()
+            _model_state.update({'status': 'error', 'error': str(e)})
+            return False
+
+
+def ensure_models(detectors=('ssd',)):
+    """Loads the models if this process has not yet; no-op once ready."""
+    if _model_state['status'] != 'ready':
+        warm_up_models(detectors)
+
+
+def model_status():
+    """Copy of this process's model state, for health and readiness reporting."""
+    return dict(_model_state)
+
+
+def warm_up_worker(config):
+    """PRELOAD_MODELS warm-up for one web worker, after it has forked.
+
+    Called from gunicorn's post_worker_init hook (gunicorn.conf.py) and by
+    run.py, never from create_app: a `gunicorn --preload` master would
+    otherwise start TensorFlow's runtime and thread pools, which forked
+    workers inherit in a broken state. Thread caps are applied first, while
+    they can still take effect.
+    """
+    if not config.get('PRELOAD_MODELS') or config.get('INFERENCE_SERVICE_ADDRESS'):
+        return False
+    _configure_local(config)
+    return warm_up_models(config.get('PRELOAD_DETECTORS', ('ssd',)))
+
+
+# --- Model calls (run in-process or inside an inference service worker) ---
+
+def locate_faces(frame, detector_backend='ssd'):
+    """Boxes (with eye points) of every face in a frame, without building crops.
+
+    Used when detection runs on a downscaled frame and the crops are cut
+    from the full-resolution upload (see app/frames.py).
+    """
+    return [face["facial_area"] for face in _extract_faces(frame, detector_backend, align=False)]
+
+
+def _extract_faces(frame, detector_backend, align):
+    from deepface import DeepFace
+    ensure_models()
+    faces = DeepFace.extract_faces(
+        frame,
+        detector_backend=detector_backend,
+        enforce_detection=False,
+        align=align
+    )
+    found = []
+    for face in faces or []:
+        area = face.get("facial_area", {})
+        # enforce_detection=False returns the whole frame when nothing is found
+        if face.get("confidence", 1) == 0 or (area.get("w") == frame.shape[1] and area.get("h") == frame.shape[0]):
+            continue
+        found.append(face)
+    return found
+
+
+def embed_faces(crops):
+    """One batched VGG-Face forward pass over an (n, h, w, 3) crop stack."""
+    if len(crops) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    model = _keras_model()
+    embeddings = model(np.asarray(crops, dtype=np.float32), training=False)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def prepare_crop(face, target_size):
+    """DeepFace-compatible preprocessing: RGB [0,1] face -> BGR, aspect-preserving pad to target_size."""
+    face = np.asarray(face, dtype=np.float32)[:, :, ::-1]
+    if face.max() > 1.0:
+        face = face / 255.0
+    target_h, target_w = target_size
+    factor = min(target_h / face.shape[0], target_w / face.shape[1])
+    new_w = max(1, int(round(face.shape[1] * factor)))
+    new_h = max(1, int(round(face.shape[0] * factor)))
+    import cv2
+    resized = cv2.resize(face, (new_w, new_h))
+    pad_h, pad_w = target_h - new_h, target_w - new_w
+    padded = np.pad(
+        resized,
+        ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+        'constant'
+    )
+    return padded.astype(np.float32)
+
+
+def _build_embedding_model():
+    from deepface import DeepFace
+    ensure_models()
+    return DeepFace.build_model(EMBEDDING_MODEL)
+
+
+def _keras_model():
+    client = _build_embedding_model()
+    # DeepFace >= 0.0.80 wraps the Keras model in a client object
+    return getattr(client, 'model', client)
+
+
+def embedding_input_size():
+    client = _build_embedding_model()
+    shape = getattr(client, 'input_shape', None)
+    if shape:
+        return (shape[1], shape[0]) if len(shape) == 2 else tuple(shape[1:3])
+    return tuple(_keras_model().input_shape[1:3])
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def configure_batching(max_batch_size=32, max_latency_ms=5.0):
+    """(Re)creates this process's embedding micro-batcher."""
+    global _batcher
+    from app.batching import MicroBatcher
+    with _batcher_lock:
+        _batcher = MicroBatcher(embed_faces, max_batch_size, max_latency_ms)
+    return _batcher
+
+
+def _local_embedder(crops):
+    if _batcher is None:
+        configure_batching()
+    return _batcher.embed(crops)
+
+
+def represent_enrollment_image(image_path):
+    """Embeds the first face of an enrollment image (RetinaFace -> SSD -> OpenCV).
+
+    Returns {'embedding', 'facial_area'} or None.
+    """
+    from deepface import DeepFace
+    ensure_models()
+    print(f"DEBUG: Generating embedding for {image_path}")
+    # returns list of dicts. We take the first face.
+    # enforce_detection=True ensures we don't register bad data.
+
+    objs = None
+
+    # 1. Try RetinaFace (Best for Profile/Side Faces)
+    try:
+        print("DEBUG: Attempting detection with RetinaFace...")
+        objs = DeepFace.represent(
+            img_path=image_path,
+            model_name=EMBEDDING_MODEL,
+            detector_backend="retinaface",
+            enforce_detection=True,
+            align=True
+        )
+    except Exception as e_retina:
+        print(f"WARNING: RetinaFace failed ({e_retina}). Falling back to SSD.")
+
+        # 2. Try SSD (Fast, Robust)
+        try:
+            print("DEBUG: Attempting detection with SSD...")
+            objs = DeepFace.represent(
+                img_path=image_path,
+                model_name=EMBEDDING_MODEL,
+                detector_backend="ssd",
+                enforce_detection=True,
+                align=True
+            )
+        except Exception as e_ssd:
+            print(f"WARNING: SSD failed ({e_ssd}). Falling back to OpenCV.")
+
+            # 3. Try OpenCV (Basic, Fails on side faces, but works)
+            objs = DeepFace.represent(
+                img_path=image_path,
+                model_name=EMBEDDING_MODEL,
+                detector_backend="opencv",
+                enforce_detection=True,
+                align=True
+            )
+
+    if objs:
+        embedding = objs[0]["embedding"]
+        # Ensure it is a list of floats (not numpy array)
+        if hasattr(embedding, "tolist"):
+            embedding = embedding.tolist()
+        return {"embedding": embedding, "facial_area": objs[0].get("facial_area")}
+    return None
+
+
+OPERATIONS = {
+    'locate': locate_faces,
+    'embed': embed_faces,
+    'enroll': represent_enrollment_image,
+    'status': model_status
+}
+
+
+def run_operation(op, args):
+    """Entry point executed inside inference service workers."""
+    return OPERATIONS[op](*args)
+
+
+# --- Dispatch ---
+
+def run_inference(op, *args):
+    """Runs a model operation in-process, or on the inference service if configured.
+
+    With INFERENCE_SERVICE_ADDRESS set (see inference_server.py) the request
+    thread only waits on a socket, so a slow frame never holds TensorFlow
+    inside a web worker. Raises InferenceBusy/InferenceTimeout when the
+    service cannot serve it in time.
+    """
+    config = current_app.config
+    address = config.get('INFERENCE_SERVICE_ADDRESS')
+    if not address:
+        _configure_local(config)
+        if op == 'embed':
+            # Share the forward pass with concurrent frames
+            return _local_embedder(*args)
+        return run_operation(op, args)
+    return _get_client(config).call(op, *args)
+
+
+def current_model_status():
+    """Model state of whoever runs inference: this process, or the service."""
+    if not current_app.config.get('INFERENCE_SERVICE_ADDRESS'):
+        return model_status()
+    try:
+        return _get_client(current_app.config).call('status', timeout=2)
+    except (InferenceUnavailable, InferenceError) as e:
+        return {'status': 'error', 'error': f"Inference service unavailable: {e}",
+                'load_seconds': None, 'loaded_at': None, 'detectors': []}
+
+
+_local_configured = False
+
+
+def _configure_local(config):
+    global _local_configured
+    if not _local_configured:
+        configure_threads(config.get('INFERENCE_INTRA_OP_THREADS'), config.get('INFERENCE_INTER_OP_THREADS'))
+        configure_batching(config.get('EMBED_BATCH_SIZE', 32), config.get('EMBED_BATCH_LATENCY_MS', 5))
+        _local_configured = True
+
+
+def parse_address(address):
+    """'host:port' -> TCP tuple, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return (host, int(port))
+    return address
+
+
+def service_authkey(config, address=None):
+    """Shared secret of the service connection.
+
+    A Unix socket is guarded by its file permissions, so SECRET_KEY may stand
+    in. A TCP address is reachable by anyone on the network and the default
+    SECRET_KEY is public, so it needs an explicit INFERENCE_SERVICE_AUTHKEY.
+    """
+    authkey = config.get('INFERENCE_SERVICE_AUTHKEY')
+    if not authkey:
+        if isinstance(parse_address(address or config.get('INFERENCE_SERVICE_ADDRESS') or ''), tuple):
+            raise ValueError("INFERENCE_SERVICE_AUTHKEY must be set when the inference service uses a TCP address")
+        authkey = config['SECRET_KEY']
+    return authkey.encode('utf-8')
+
+
+class InferenceClient:
+    """Thread-safe client for the inference service: one connection per thread."""
+
+    def __init__(self, address, authkey, timeout):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def call(self, op, *args, timeout=None):
+        conn = self._connection()
+        try:
+            conn.send((op, args))
+            if not conn.poll(timeout or self.timeout):
+                # Abandon the connection: a late reply must not reach the next call
+                self._drop()
+                raise InferenceTimeout(f"'{op}' took longer than {timeout or self.timeout}s")
+            status, payload = conn.recv()
+        except (EOFError, OSError) as e:
+            self._drop()
+            raise InferenceUnavailable(str(e))
+
+        if status == 'busy':
+            raise InferenceBusy("Inference queue is full")
+        if status == 'error':
+            raise InferenceError(payload)
+        return payload
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError) as e:
+                raise InferenceUnavailable(f"Cannot reach inference service at {self.address}: {e}")
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+
+_clients = {}
+
+
+def _get_client(config):
+    address = config['INFERENCE_SERVICE_ADDRESS']
+    if address not in _clients:
+        _clients[address] = InferenceClient(address, service_authkey(config), config.get('INFERENCE_TIMEOUT', 10))
+    return _clients[address]
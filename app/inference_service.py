@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Listener
+
+from app.batching import MicroBatcher
+from app.inference import OPERATIONS, configure_threads, parse_address, run_operation, warm_up_models
+
+
+def _init_worker(intra_op, inter_op, detectors):
+    # Threads must be capped before TensorFlow is imported by the warm-up
+    configure_threads(intra_op, inter_op)
+    warm_up_models(detectors)
+
+
+class InferenceService:
+    """Host-local model server: a process pool that owns the face models.
+
+    Web workers connect over a Unix (or TCP) socket and send (op, args).
+    At most `queue_size` requests are accepted at once; beyond that the
+    client is told 'busy' immediately instead of queueing without bound.
+    Each pool process runs with its own intra/inter-op thread caps, so
+    workers x intra_op threads can be sized to the machine's cores.
+
+    'embed' requests (crops cut by the web worker after a 'locate') from
+    all in-flight frames are coalesced by a MicroBatcher into one forward
+    pass; every other op runs as is in the pool.
+    """
+
+    def __init__(self, address, authkey, workers=2, queue_size=8,
+                 intra_op=None, inter_op=None, detectors=('ssd',),
+                 batch_size=32, batch_latency_ms=5.0):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(queue_size)
+        # spawn, not fork: TensorFlow state must not be inherited across fork
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(intra_op, inter_op, tuple(detectors))
+        )
+        self.batcher = MicroBatcher(self._embed_in_pool, batch_size, batch_latency_ms)
+
+    def _embed_in_pool(self, crops):
+        return self.executor.submit(run_operation, 'embed', (crops,)).result()
+
+    def _run(self, op, args):
+        if op == 'embed':
+            return self.batcher.embed(*args)
+        return self.executor.submit(run_operation, op, args).result()
+
+    def warm_up(self):
+        """Starts every pool process so models are hot before the first frame."""
+        futures = [self.executor.submit(run_operation, 'status', ()) for _ in range(self.workers)]
+        for future in futures:
+            print(f"Inference worker ready: {future.result()['status']}")
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # Stale socket from a previous run
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Inference service listening on {self.address} ({self.workers} workers)")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # Failed handshake (bad authkey) etc.
+                    print(f"Inference Connection Error: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                if op not in OPERATIONS:
+                    reply = ('error', f"Unknown operation '{op}'")
+                elif not self.slots.acquire(blocking=False):
+                    reply = ('busy', None)
+                else:
+                    try:
+                        reply = ('ok', self._run(op, args))
+                    except Exception as e:
+                        reply = ('error', str(e))
+                    finally:
+                        self.slots.release()
+
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError):
+                    return  # Client gave up (timeout) and closed the connection
@@ -1,19 +1,78 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from app import db
-from app.models import User, Student, Attendance, Session, SystemLog, UnknownFace, CameraStatus, FaceData
+from app.models import User, Student, Attendance, Session, SystemLog, UnknownFace, CameraStatus, FaceData, DailyAttendanceRollup, StudentEngagement
 from flask_login import current_user, login_required
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, time, timedelta
+from app.inference import current_model_status
+from app.cache import TTLCache
+from app.attendance import ATTENDED_STATUSES
+from app.events import bus
+import hashlib
+import json
 import random
 
 api = Blueprint('api', __name__)
 
+MODEL_STATUS_LABELS = {
+    'cold': 'Not Loaded',
+    'loading': 'Loading',
+    'ready': 'Loaded',
+    'error': 'Error'
+}
+
+@api.route('/health/ready')
+def readiness():
+    """Readiness probe: 200 once this worker's face models are hot, else 503."""
+    state = current_model_status()
+    body = {
+        "ready": state['status'] == 'ready',
+        "model": state['status'],
+        "load_seconds": state['load_seconds'],
+        "detectors": state['detectors']
+    }
+    if state['error']:
+        body["error"] = state['error']
+    return jsonify(body), 200 if body["ready"] else 503
+
+def day_bounds(day):
+    """[start, end) datetimes of `day`, so filters stay index range scans (unlike date(column))."""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+# Dashboard stats are the same for every viewer: computed at most once per
+# DASHBOARD_STATS_TTL_SECONDS per process and served with an ETag, so polls
+# that find nothing new get an empty 304
+stats_cache = TTLCache()
+
+# Any committed change published on the event bus may change the stats
+bus.add_listener(lambda kind, data: stats_cache.invalidate('dashboard_stats'))
+
+def cached_dashboard_stats():
+    """(JSON body, ETag) of the shared stats payload."""
+    return stats_cache.get(
+        'dashboard_stats', _render_dashboard_stats, current_app.config.get('DASHBOARD_STATS_TTL_SECONDS', 5)
+    )
+
 @api.route('/dashboard/stats')
 @login_required
 def dashboard_stats():
+    body, etag = cached_dashboard_stats()
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def _render_dashboard_stats():
+    body = json.dumps(compute_dashboard_stats(), sort_keys=True)
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
+def compute_dashboard_stats():
     today = date.today()
+    day_start, day_end = day_bounds(today)
     
     # 1. AI Confidence Meter (Latest Attendance)
-    latest_attendance = Attendance.query.order_by(Attendance.time_marked.desc()).first()
+    latest_attendance = Attendance.query.filter(Attendance.status.in_(ATTENDED_STATUSES)) \
+        .order_by(Attendance.time_marked.desc()).first()
     recognition_stats = {
         "confidence": round(latest_attendance.confidence * 100, 1) if latest_attendance and latest_attendance.confidence else 98.5,
         "time": round(latest_attendance.recognition_time, 2) if latest_attendance and latest_attendance.recognition_time else 0.45,
@@ -21,7 +80,7 @@ def dashboard_stats():
     }
 
     # 2. Unknown Face Detection
-    unknown_faces_today = UnknownFace.query.filter(db.func.date(UnknownFace.timestamp) == today).count()
+    unknown_faces_today = UnknownFace.query.filter(UnknownFace.timestamp >= day_start, UnknownFace.timestamp < day_end).count()
     latest_unknown = UnknownFace.query.order_by(UnknownFace.timestamp.desc()).first()
     
     # 3. Smart Attendance Timer (Find active session)
@@ -38,23 +97,32 @@ def dashboard_stats():
     # 4. System Health Monitor
     health_status = {
         "camera": "Active", # In real app, check CameraStatus
-        "model": "Loaded",
+        "model": MODEL_STATUS_LABELS.get(current_model_status()['status'], 'Unknown'),
         "dataset": "Synced",
         "database": "Connected",
         "server": "Running"
     }
 
-    # 5. Daily Summary
-    total_sessions_today = Session.query.filter_by(date=today).count()
-    # Simple aggregation
-    attendance_count = Attendance.query.filter(db.func.date(Attendance.time_marked) == today, Attendance.status=='Present').count()
+    # 5. Daily Summary, from the daily rollup: attendance % = students marked
+    # present or late over class size x sessions held today
+    today_rollup = db.session.query(
+        DailyAttendanceRollup.class_name,
+        db.func.sum(DailyAttendanceRollup.sessions),
+        db.func.sum(DailyAttendanceRollup.present + DailyAttendanceRollup.late)
+    ).filter(DailyAttendanceRollup.day == today).group_by(DailyAttendanceRollup.class_name).all()
+    class_sizes = dict(db.session.query(Student.class_name, db.func.count(Student.id)).filter(
+        Student.class_name.in_([class_name for class_name, _, _ in today_rollup])
+    ).group_by(Student.class_name).all()) if today_rollup else {}
+    total_sessions_today = sum(sessions or 0 for _, sessions, _ in today_rollup)
+    attended_today = sum(attended or 0 for _, _, attended in today_rollup)
+    expected_today = sum((sessions or 0) * class_sizes.get(class_name, 0) for class_name, sessions, _ in today_rollup)
+    attendance_percent = round(min(100.0, attended_today / expected_today * 100), 1) if expected_today else 0
     
-    # 6. Student Engagement (At Risk)
-    # This is expensive to calc on every poll, so maybe cache or simplified logic
-    # For now, return a random count for demo if real calc is too heavy
-    at_risk_count = 0 
+    # 6. Student Engagement (At Risk), precomputed by app/engagement.py
+    at_risk_count = db.session.query(db.func.count(db.distinct(StudentEngagement.student_id))) \
+        .filter(StudentEngagement.at_risk.is_(True)).scalar()
     
-    return jsonify({
+    return {
         "recognition": recognition_stats,
         "unknown_faces": {
             "count": unknown_faces_today,
@@ -64,9 +132,10 @@ def dashboard_stats():
         "health": health_status,
         "summary": {
             "total_classes": total_sessions_today,
-            "attendance_percent": 86 # Placeholder calculation
+            "attendance_percent": attendance_percent,
+            "at_risk_count": at_risk_count
         }
-    })
+    }
 
 @api.route('/student/attendance_history')
 @login_required
@@ -1,8 +1,14 @@
 from datetime import datetime
 from app import db, login_manager
+from flask import current_app, has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+import numpy as np
 import json
 
+# Storage dtypes accepted for FaceData.embedding_blob
+EMBEDDING_DTYPES = ('float32', 'float16')
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -51,17 +57,49 @@ class Subject(db.Model):
 class FaceData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), unique=True, nullable=False)
-    embedding = db.Column(db.Text, nullable=False) # JSON serialized list
+    embedding = db.Column(db.Text, nullable=False, default='') # Legacy JSON list, emptied once embedding_blob is set
+    embedding_blob = db.Column(db.LargeBinary, nullable=True) # Raw little-endian vector bytes
+    embedding_dtype = db.Column(db.String(10), nullable=True) # 'float32' or 'float16'
     image_path = db.Column(db.String(200), nullable=False) # Path to representative image
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def set_embedding(self, embedding_list):
-        self.embedding = json.dumps(embedding_list)
+    def set_embedding(self, embedding_list, dtype=None):
+        if dtype is None:
+            dtype = current_app.config.get('EMBEDDING_STORAGE_DTYPE', 'float32') if has_app_context() else 'float32'
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.embedding_blob = np.asarray(embedding_list, dtype=_storage_dtype(dtype)).tobytes()
+        self.embedding_dtype = dtype
+        self.embedding = ''
+
+    def get_embedding_array(self):
+        """Zero-copy, read-only view of the stored vector (None if nothing stored)."""
+        if self.embedding_blob:
+            return np.frombuffer(self.embedding_blob, dtype=_storage_dtype(self.embedding_dtype))
+        if self.embedding:
+            # Rows not yet converted by migrate_embeddings.py
+            return np.asarray(json.loads(self.embedding), dtype=np.float32)
+        return None
 
     def get_embedding(self):
-        return json.loads(self.embedding)
+        embedding = self.get_embedding_array()
+        return embedding.tolist() if embedding is not None else None
+
+def _storage_dtype(name):
+    return np.dtype(name or 'float32').newbyteorder('<')
+
+class GalleryChange(db.Model):
+    """Append-only log of gallery-affecting changes; the max id is the gallery version."""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, nullable=False) # No FK: must outlive deleted students
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Session(db.Model):
+    __table_args__ = (
+        db.Index('ix_session_date', 'date'),
+        db.Index('ix_session_subject_date', 'subject_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -72,6 +110,17 @@ class Session(db.Model):
     attendance_records = db.relationship('Attendance', backref='session', lazy=True)
 
 class Attendance(db.Model):
+    # One row per student per session, enforced by the DB so racing workers
+    # cannot double-mark (existing databases: dedupe_attendance.py, then flask db upgrade).
+    # The indexes serve per-session marking, a student's history in time order
+    # and "today" ranges on time_marked (existing databases: flask db upgrade)
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'session_id', name='uq_attendance_student_session'),
+        db.Index('ix_attendance_session_student', 'session_id', 'student_id'),
+        db.Index('ix_attendance_student_time', 'student_id', 'time_marked'),
+        db.Index('ix_attendance_time_marked', 'time_marked'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False)
@@ -81,7 +130,50 @@ class Attendance(db.Model):
     recognition_time = db.Column(db.Float, nullable=True) # Time taken to recognize in seconds
     is_spoof = db.Column(db.Boolean, default=False) # Anti-spoofing flag
 
+class DailyAttendanceRollup(db.Model):
+    """Per-day, per-subject attendance totals that dashboards read instead of Attendance.
+
+    Kept in step with Attendance inside the same transaction (see
+    app/attendance.py); rebuild with backfill_rollup.py.
+    """
+    __table_args__ = (db.UniqueConstraint('day', 'subject_id', 'class_name', name='uq_rollup_day_subject_class'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False) # Session.date
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    class_name = db.Column(db.String(50), nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+
+class StudentEngagement(db.Model):
+    """Per-student, per-subject attendance summary over ended sessions.
+
+    Computed in bulk by app/engagement.py (after each session ends and by
+    refresh_engagement.py), so dashboards read at-risk flags instead of
+    recomputing them from Attendance.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', name='uq_engagement_student_subject'),
+        db.Index('ix_engagement_at_risk', 'at_risk', 'student_id'),
+        db.Index('ix_engagement_subject', 'subject_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    sessions_held = db.Column(db.Integer, nullable=False, default=0)
+    attended = db.Column(db.Integer, nullable=False, default=0) # Present or Late
+    attendance_ratio = db.Column(db.Float, nullable=False, default=0.0)
+    absence_streak = db.Column(db.Integer, nullable=False, default=0) # Most recent sessions missed in a row
+    longest_absence_streak = db.Column(db.Integer, nullable=False, default=0)
+    at_risk = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class UnknownFace(db.Model):
+    __table_args__ = (db.Index('ix_unknown_face_timestamp', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     image_path = db.Column(db.String(200), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -108,3 +200,31 @@ class PasswordResetRequest(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='password_requests')
+
+
+# --- Gallery versioning ---
+# Every FaceData insert/update/delete (and a student moving class or department)
+# appends a GalleryChange row in the same transaction, so cached session
+# galleries can pull just the changed students (see app/gallery.py).
+
+def _record_gallery_change(connection, student_id, target):
+    result = connection.execute(GalleryChange.__table__.insert().values(
+        student_id=student_id, timestamp=datetime.utcnow()
+    ))
+    session = inspect(target).session
+    if session is not None:
+        # Published to GALLERY_VERSION_FILE once the transaction commits
+        change_id = result.inserted_primary_key[0]
+        session.info['gallery_version'] = max(session.info.get('gallery_version', 0), change_id)
+
+@event.listens_for(FaceData, 'after_insert')
+@event.listens_for(FaceData, 'after_update')
+@event.listens_for(FaceData, 'after_delete')
+def _face_data_changed(mapper, connection, target):
+    _record_gallery_change(connection, target.student_id, target)
+
+@event.listens_for(Student, 'after_update')
+def _student_moved(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.class_name.history.has_changes() or state.attrs.department.history.has_changes():
+        _record_gallery_change(connection, target.id, target)
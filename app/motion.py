@@ -0,0 +1,50 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap per-session change detector run before any face inference.
+
+    Each frame is reduced to a small grayscale thumbnail and compared with
+    the thumbnail of the last frame that was actually processed. If too few
+    pixels changed, the caller can reuse that frame's detections instead of
+    running SSD and VGG-Face again. A full run is forced at least every
+    `max_skip_seconds` so slow drift (someone sitting down) is never missed.
+    """
+
+    def __init__(self, size=(64, 48), pixel_delta=12, min_changed_fraction=0.005, max_skip_seconds=5.0):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip_seconds = max_skip_seconds
+        self.reference = None
+        self.detections = None
+        self.last_run = 0.0
+        self._candidate = None
+
+    def check(self, frame):
+        """Returns True if `frame` should go through inference."""
+        thumb = self._thumbnail(frame)
+        self._candidate = thumb
+        if self.reference is None or self.detections is None or thumb.shape != self.reference.shape:
+            return True
+        if time.monotonic() - self.last_run >= self.max_skip_seconds:
+            return True
+        return self.changed_fraction(thumb) >= self.min_changed_fraction
+
+    def changed_fraction(self, thumb):
+        diff = cv2.absdiff(thumb, self.reference)
+        return np.count_nonzero(diff > self.pixel_delta) / diff.size
+
+    def update(self, detections):
+        """Records the result of a processed frame as the new reference."""
+        self.reference = self._candidate
+        self.detections = detections
+        self.last_run = time.monotonic()
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        # INTER_AREA averages pixels, which also smooths out sensor noise
+        return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+
+# Faces are compared on a fixed-size grey patch so sharpness does not depend
+# on how large the face is in the frame
+PATCH_SIZE = 64
+
+
+class QualityRejected(Exception):
+    """An enrollment image is too poor to give a reliable embedding."""
+
+
+class QualityGate:
+    """Cheap per-face checks that run before VGG-Face.
+
+    Size is the shorter box side in source pixels, sharpness the variance of
+    the Laplacian, brightness the mean grey level, and yaw how far the eye
+    midpoint sits from the box centre (0 = frontal, 1 = at the box edge).
+    Faces without eye landmarks skip the pose check.
+    """
+
+    def __init__(self, min_size=40, min_sharpness=30.0, min_brightness=40.0,
+                 max_brightness=220.0, max_yaw=0.45):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_size=config.get('QUALITY_MIN_FACE_SIZE', 40),
+            min_sharpness=config.get('QUALITY_MIN_SHARPNESS', 30.0),
+            min_brightness=config.get('QUALITY_MIN_BRIGHTNESS', 40.0),
+            max_brightness=config.get('QUALITY_MAX_BRIGHTNESS', 220.0),
+            max_yaw=config.get('QUALITY_MAX_YAW', 0.45)
+        )
+
+    def check_lighting(self, image):
+        """Whole-image brightness check, cheap enough to run before face detection."""
+        brightness = measure_faces(image, [{'x': 0, 'y': 0, 'w': image.shape[1], 'h': image.shape[0]}])['brightness'][0]
+        if brightness < self.min_brightness:
+            return 'too dark'
+        if brightness > self.max_brightness:
+            return 'overexposed'
+        return None
+
+    def check(self, frame, areas):
+        """Returns (ok, reasons): a bool array and one reason string (or None) per face."""
+        scores = measure_faces(frame, areas)
+        failures = [
+            ('too small', scores['size'] < self.min_size),
+            ('blurred', scores['sharpness'] < self.min_sharpness),
+            ('too dark', scores['brightness'] < self.min_brightness),
+            ('overexposed', scores['brightness'] > self.max_brightness),
+            ('turned away', scores['yaw'] > self.max_yaw)  # NaN (no eyes) compares False
+        ]
+        reasons = [None] * len(areas)
+        for reason, failed in failures:
+            for i in np.flatnonzero(failed):
+                if reasons[i] is None:
+                    reasons[i] = reason
+        ok = np.array([r is None for r in reasons], dtype=bool)
+        return ok, reasons
+
+
+def measure_faces(frame, areas):
+    """Vectorized quality scores for the boxes `areas` (x/y/w/h dicts) in a BGR frame."""
+    n = len(areas)
+    if n == 0:
+        empty = np.empty(0, dtype=np.float32)
+        return {'size': empty, 'sharpness': empty, 'brightness': empty, 'yaw': empty}
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    frame_h, frame_w = gray.shape
+    patches = np.empty((n, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
+    size = np.empty(n, dtype=np.float32)
+    yaw = np.full(n, np.nan, dtype=np.float32)
+    for i, area in enumerate(areas):
+        x, y = max(0, int(area['x'])), max(0, int(area['y']))
+        w = max(1, min(int(area['w']), frame_w - x))
+        h = max(1, min(int(area['h']), frame_h - y))
+        patches[i] = cv2.resize(gray[y:y + h, x:x + w], (PATCH_SIZE, PATCH_SIZE), interpolation=cv2.INTER_AREA)
+        size[i] = min(w, h)
+        left, right = area.get('left_eye'), area.get('right_eye')
+        if left and right:
+            eye_mid = (left[0] + right[0]) / 2.0
+            yaw[i] = abs(eye_mid - (x + w / 2.0)) / (w / 2.0)
+
+    # 4-neighbour Laplacian over the whole stack at once
+    lap = (4 * patches[:, 1:-1, 1:-1] - patches[:, :-2, 1:-1] - patches[:, 2:, 1:-1]
+           - patches[:, 1:-1, :-2] - patches[:, 1:-1, 2:])
+    return {
+        'size': size,
+        'sharpness': lap.reshape(n, -1).var(axis=1),
+        'brightness': patches.reshape(n, -1).mean(axis=1),
+        'yaw': yaw
+    }
@@ -6,18 +6,21 @@ document.addEventListener('DOMContentLoaded', function () {
     if (!document.getElementById('confidence-val')) return;
 
     function fetchStats() {
-        fetch('/api/dashboard/stats')
+        // no-cache: revalidate with If-None-Match, unchanged stats come back as 304
+        fetch('/api/dashboard/stats', { cache: 'no-cache' })
             .then(response => response.json())
-            .then(data => {
-                updateConfidenceMeter(data.recognition);
-                updateUnknownFaces(data.unknown_faces);
-                updateSessionInfo(data.session);
-                updateSystemHealth(data.health);
-                updateEngagement(data.summary);
-            })
+            .then(showStats)
             .catch(err => console.error('Error fetching stats:', err));
     }
 
+    function showStats(data) {
+        updateConfidenceMeter(data.recognition);
+        updateUnknownFaces(data.unknown_faces);
+        updateSessionInfo(data.session);
+        updateSystemHealth(data.health);
+        updateEngagement(data.summary);
+    }
+
     function updateConfidenceMeter(data) {
         document.getElementById('confidence-val').innerText = data.confidence + '%';
         document.getElementById('rec-time').innerText = data.time + 's';
@@ -67,11 +70,13 @@ document.addEventListener('DOMContentLoaded', function () {
             document.getElementById('total-classes').innerText = data.total_classes;
         if (document.getElementById('avg-attendance'))
             document.getElementById('avg-attendance').innerText = data.attendance_percent + '%';
+        if (document.getElementById('at-risk-count'))
+            document.getElementById('at-risk-count').innerText = data.at_risk_count;
     }
 
     // Initial fetch
     fetchStats();
-    // Poll every 5 seconds
+    // Poll every 5 seconds (cheap: the stats are shared and usually a 304)
     setInterval(fetchStats, 5000);
 });
 
@@ -78,8 +78,6 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 
     saveBtn.addEventListener("click", () => {
-        const dataUrl = photo.src;
-        const studentId = document.getElementById("student-id").value;
         const uploadUrl = document.getElementById("upload-url").value;
         const csrfToken = document.getElementById("csrf-token").value;
 
@@ -89,17 +87,16 @@ document.addEventListener("DOMContentLoaded", () => {
         saveBtn.disabled = true;
         retakeBtn.disabled = true;
 
-        fetch(uploadUrl, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "X-CSRFToken": csrfToken
-            },
-            body: JSON.stringify({
-                image: dataUrl,
-                student_id: studentId
-            })
-        })
+        // Send the captured canvas as raw JPEG bytes instead of a base64 data URL
+        new Promise(resolve => canvas.toBlob(resolve, "image/jpeg"))
+            .then(blob => fetch(uploadUrl, {
+                method: "POST",
+                headers: {
+                    "Content-Type": "image/jpeg",
+                    "X-CSRFToken": csrfToken
+                },
+                body: blob
+            }))
             .then(response => {
                 if (!response.ok) {
                     // If server returns 500 or 400
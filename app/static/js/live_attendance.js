@@ -8,6 +8,10 @@ document.addEventListener("DOMContentLoaded", () => {
     // Config
     const sessionId = document.getElementById("session-id").value;
     const csrfToken = document.getElementById("csrf-token").value;
+    // Identifies this browser tab's camera so several cameras can share a session
+    const cameraId = Math.random().toString(36).slice(2, 10);
+    const streamInput = document.getElementById("stream-url");
+    const streamUrl = streamInput ? streamInput.value : null;
 
     const refreshBtn = document.getElementById("refresh-db-btn");
 
@@ -57,89 +61,63 @@ document.addEventListener("DOMContentLoaded", () => {
         canvas.width = video.videoWidth;
         canvas.height = video.videoHeight;
 
-        // Offscreen canvas for sending data (smaller = faster)
-        const sendCanvas = document.createElement('canvas');
-        const sendWidth = 800; // Balanced: 800px is good for RetinaFace speed vs accuracy
+        // WebSocket when the server offers it; HTTP POST per frame otherwise
+        if (streamUrl && window.WebSocket) {
+            startStream();
+        } else {
+            startHttpLoop();
+        }
+    });
+
+    // Offscreen canvas for sending data (smaller = faster)
+    const sendCanvas = document.createElement('canvas');
+    // Full camera resolution: the server detects on a downscaled copy but cuts
+    // face crops from this, so back-row faces keep their detail
+    const maxSendWidth = 1280;
+
+    async function captureFrame() {
+        // Sync Main Canvas size if window resized
+        if (canvas.width !== video.videoWidth) {
+            canvas.width = video.videoWidth;
+            canvas.height = video.videoHeight;
+        }
+
+        // Sync Send Canvas size (maintain aspect ratio)
+        const sendWidth = Math.min(video.videoWidth, maxSendWidth);
+        const aspectRatio = video.videoWidth / video.videoHeight;
+        const sendHeight = sendWidth / aspectRatio;
+        sendCanvas.width = sendWidth;
+        sendCanvas.height = sendHeight;
+
+        // Draw video to OFFSCREEN canvas for sending
+        const sendContext = sendCanvas.getContext("2d");
+        sendContext.drawImage(video, 0, 0, sendCanvas.width, sendCanvas.height);
+
+        // Capture Data (smaller image) as raw JPEG bytes - no base64 round trip
+        return new Promise(resolve => sendCanvas.toBlob(resolve, "image/jpeg", 0.7));
+    }
 
+    function startHttpLoop() {
         setInterval(async () => {
             if (video.paused || video.ended || isProcessing) return;
 
-            // Sync Main Canvas size if window resized
-            if (canvas.width !== video.videoWidth) {
-                canvas.width = video.videoWidth;
-                canvas.height = video.videoHeight;
-            }
-
-            // Sync Send Canvas size (maintain aspect ratio)
-            const aspectRatio = video.videoWidth / video.videoHeight;
-            const sendHeight = sendWidth / aspectRatio;
-            sendCanvas.width = sendWidth;
-            sendCanvas.height = sendHeight;
-
-            // Draw video to OFFSCREEN canvas for sending
-            const sendContext = sendCanvas.getContext("2d");
-            sendContext.drawImage(video, 0, 0, sendCanvas.width, sendCanvas.height);
-
-            // Capture Data (smaller image)
-            const dataUrl = sendCanvas.toDataURL("image/jpeg", 0.7);
-
-            // Send to Backend
             isProcessing = true;
             try {
-                const response = await fetch("/faculty/process_frame", {
+                const blob = await captureFrame();
+                if (!blob) return;
+
+                // Send to Backend
+                const response = await fetch(`/faculty/process_frame/${sessionId}`, {
                     method: "POST",
                     headers: {
-                        "Content-Type": "application/json",
-                        "X-CSRFToken": csrfToken
+                        "Content-Type": "image/jpeg",
+                        "X-CSRFToken": csrfToken,
+                        "X-Camera-Id": cameraId
                     },
-                    body: JSON.stringify({ image: dataUrl, session_id: sessionId })
+                    body: blob
                 });
 
-                const data = await response.json();
-
-                // 3. Draw Bounding Boxes on MAIN canvas
-                // Clear the main canvas to show the video underneath
-                context.clearRect(0, 0, canvas.width, canvas.height);
-
-                if (data.detected_faces && data.detected_faces.length > 0) {
-                    // Calculate Scale Factors (Main / Sent)
-                    const scaleX = canvas.width / sendCanvas.width;
-                    const scaleY = canvas.height / sendCanvas.height;
-
-                    data.detected_faces.forEach(face => {
-                        // Rescale box to match video display
-                        const x = face.box.x * scaleX;
-                        const y = face.box.y * scaleY;
-                        const w = face.box.w * scaleX;
-                        const h = face.box.h * scaleY;
-
-                        const name = face.name;
-                        const isMatch = face.match;
-
-                        // Style
-                        context.lineWidth = 3;
-                        context.strokeStyle = isMatch ? "#00ff88" : "#ff3366"; // Green vs Red
-                        context.strokeRect(x, y, w, h);
-
-                        // Label
-                        context.fillStyle = isMatch ? "#00ff88" : "#ff3366";
-                        context.font = "bold 18px Courier New";
-                        context.fillText(name, x, y - 10);
-                    });
-                }
-
-                // 4. Handle New Attendance
-                if (data.new_students && data.new_students.length > 0) {
-                    data.new_students.forEach(student => {
-                        logEvent(`New Attendance: ${student.name} (${student.roll_no})`, "success");
-                        // Play Beep
-                        playBeep();
-
-                        // Update Counter
-                        let count = parseInt(presentCount.innerText) || 0;
-                        presentCount.innerText = count + 1;
-                    });
-                }
+                showResult(await response.json());
 
             } catch (err) {
                 console.error("Processing Error:", err);
@@ -148,7 +126,91 @@ document.addEventListener("DOMContentLoaded", () => {
             }
 
         }, 500); // 500ms loop (2 FPS) - Reduced from 300ms for performance
-    });
+    }
+
+    function startStream() {
+        const scheme = window.location.protocol === "https:" ? "wss://" : "ws://";
+        const ws = new WebSocket(`${scheme}${window.location.host}${streamUrl}?camera=${cameraId}`);
+        ws.binaryType = "arraybuffer";
+        let opened = false;
+
+        ws.onopen = () => {
+            opened = true;
+            logEvent("Live stream connected.", "system");
+        };
+
+        ws.onmessage = async (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === "result") {
+                showResult(message);
+            } else if (message.type === "ready") {
+                // Server asked for the next frame
+                while (video.paused || video.ended) {
+                    await new Promise(resolve => setTimeout(resolve, 250));
+                }
+                const blob = await captureFrame();
+                if (blob && ws.readyState === WebSocket.OPEN) ws.send(blob);
+            } else if (message.type === "ended" || message.type === "error") {
+                logEvent("Stream closed: " + message.message, "error");
+            }
+        };
+
+        ws.onclose = () => {
+            if (!opened) {
+                // Server or proxy without WebSocket support
+                logEvent("Live stream unavailable, using HTTP.", "system");
+                startHttpLoop();
+            } else {
+                logEvent("Live stream disconnected.", "error");
+            }
+        };
+    }
+
+    function showResult(data) {
+        // 3. Draw Bounding Boxes on MAIN canvas
+        // Clear the main canvas to show the video underneath
+        context.clearRect(0, 0, canvas.width, canvas.height);
+
+        if (data.detected_faces && data.detected_faces.length > 0) {
+            // Calculate Scale Factors (Main / Sent)
+            const scaleX = canvas.width / sendCanvas.width;
+            const scaleY = canvas.height / sendCanvas.height;
+
+            data.detected_faces.forEach(face => {
+                // Rescale box to match video display
+                const x = face.box.x * scaleX;
+                const y = face.box.y * scaleY;
+                const w = face.box.w * scaleX;
+                const h = face.box.h * scaleY;
+
+                const name = face.name;
+                const isMatch = face.match;
+
+                // Style
+                context.lineWidth = 3;
+                context.strokeStyle = isMatch ? "#00ff88" : "#ff3366"; // Green vs Red
+                context.strokeRect(x, y, w, h);
+
+                // Label
+                context.fillStyle = isMatch ? "#00ff88" : "#ff3366";
+                context.font = "bold 18px Courier New";
+                context.fillText(name, x, y - 10);
+            });
+        }
+
+        // 4. Handle New Attendance
+        if (data.new_students && data.new_students.length > 0) {
+            data.new_students.forEach(student => {
+                logEvent(`New Attendance: ${student.name} (${student.roll_no})`, "success");
+                // Play Beep
+                playBeep();
+
+                // Update Counter
+                let count = parseInt(presentCount.innerText) || 0;
+                presentCount.innerText = count + 1;
+            });
+        }
+    }
 
     function logEvent(msg, type = "info") {
         const div = document.createElement("div");
@@ -1,4 +1,5 @@
 from flask import render_template, url_for, flash, redirect
+from app import db
 from app.student import student
 from app.models import Student, Subject, Session, Attendance
 from flask_login import login_required, current_user
@@ -14,34 +15,34 @@ def dashboard():
         flash("Student profile not found.", "danger")
         return redirect(url_for('main.home'))
         
-    # Get all subjects for student's class
-    subjects = Subject.query.filter_by(class_name=student_profile.class_name).all()
+    # One grouped query for every subject of the student's class: sessions held
+    # and sessions this student was present at (at most one row per session)
+    rows = db.session.query(
+        Subject.name,
+        Subject.class_name,
+        db.func.count(Session.id),
+        db.func.count(Attendance.id)
+    ).outerjoin(Session, Session.subject_id == Subject.id) \
+     .outerjoin(Attendance, db.and_(
+         Attendance.session_id == Session.id,
+         Attendance.student_id == student_profile.id,
+         Attendance.status == 'Present'
+     )) \
+     .filter(Subject.class_name == student_profile.class_name) \
+     .group_by(Subject.id) \
+     .order_by(Subject.id) \
+     .all()
     
     attendance_data = []
     total_sessions_all = 0
     total_attended_all = 0
     
-    for subject in subjects:
-        # Count total ACTIVE or COMPLETED sessions for this subject
-        sessions = Session.query.filter_by(subject_id=subject.id).all()
-        session_ids = [s.id for s in sessions]
-        total_sessions = len(sessions)
-        
-        # Count attendance records for this student in those sessions
-        if total_sessions > 0:
-            attended = Attendance.query.filter(
-                Attendance.session_id.in_(session_ids),
-                Attendance.student_id == student_profile.id,
-                Attendance.status == 'Present'
-            ).count()
-        else:
-            attended = 0
-            
+    for name, class_name, total_sessions, attended in rows:
         percent = round((attended / total_sessions * 100), 1) if total_sessions > 0 else 0
         
         attendance_data.append({
-            'subject': subject.name,
-            'class_name': subject.class_name,
+            'subject': name,
+            'class_name': class_name,
             'total': total_sessions,
             'attended': attended,
             'percent': percent
@@ -0,0 +1,129 @@
+import itertools
+
+import numpy as np
+
+
+class Track:
+    """One face followed across frames of a live session."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box, frame_no):
+        self.id = next(Track._ids)
+        self.box = np.asarray(box, dtype=np.float32)  # x, y, w, h
+        self.velocity = np.zeros(2, dtype=np.float32)  # centre motion per frame
+        self.identity = None  # student info dict once matched
+        self.dist = None
+        self.confident = False
+        self.hits = 1
+        self.last_seen = frame_no
+        self.last_embedded = None
+
+    def predicted_box(self, frame_no):
+        box = self.box.copy()
+        box[:2] += self.velocity * (frame_no - self.last_seen)
+        return box
+
+
+class SessionTracker:
+    """Links face boxes across frames by IoU with constant-velocity motion.
+
+    A track whose identity was matched with a confident distance keeps it
+    without re-running VGG-Face; it is only re-embedded every
+    `reverify_every` frames to catch swaps. Unidentified tracks are retried
+    every `unknown_retry_every` frames.
+    """
+
+    def __init__(self, iou_threshold=0.3, reverify_every=10, unknown_retry_every=1,
+                 max_missed=5, confident_dist=0.45):
+        self.iou_threshold = iou_threshold
+        self.reverify_every = max(1, reverify_every)
+        self.unknown_retry_every = max(1, unknown_retry_every)
+        self.max_missed = max_missed
+        self.confident_dist = confident_dist
+        self.tracks = []
+        self.frame_no = 0
+
+    def update(self, boxes):
+        """Associates this frame's boxes with tracks; returns one Track per box, in order."""
+        self.frame_no += 1
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        assigned = [None] * len(boxes)
+
+        if len(boxes) and self.tracks:
+            predicted = np.stack([t.predicted_box(self.frame_no) for t in self.tracks])
+            overlap = iou_matrix(boxes, predicted)
+            # Greedy association, best overlap first
+            taken = set()
+            for flat in np.argsort(-overlap, axis=None):
+                det, trk = np.unravel_index(flat, overlap.shape)
+                if overlap[det, trk] < self.iou_threshold:
+                    break
+                if assigned[det] is not None or trk in taken:
+                    continue
+                track = self.tracks[trk]
+                self._advance(track, boxes[det])
+                assigned[det] = track
+                taken.add(trk)
+
+        for det, track in enumerate(assigned):
+            if track is None:
+                track = Track(boxes[det], self.frame_no)
+                self.tracks.append(track)
+                assigned[det] = track
+
+        self.tracks = [t for t in self.tracks if self.frame_no - t.last_seen <= self.max_missed]
+        return assigned
+
+    def needs_embedding(self, track):
+        if track.last_embedded is None:
+            return True
+        age = self.frame_no - track.last_embedded
+        if track.identity is not None and track.confident:
+            return age >= self.reverify_every
+        return age >= self.unknown_retry_every
+
+    def record(self, track, student, dist, threshold):
+        """Stores a fresh match result; returns True if the track's identity changed."""
+        track.last_embedded = self.frame_no
+        track.dist = dist
+        new_identity = student if (student is not None and dist < threshold) else None
+        changed = (new_identity or {}).get('id') != (track.identity or {}).get('id')
+        track.identity = new_identity
+        track.confident = new_identity is not None and dist < self.confident_dist
+        return changed
+
+    def forget_identities(self, student_ids):
+        """Clears tracks identified as one of these students (their gallery
+        entry changed), so the next frame re-embeds them; returns how many."""
+        cleared = 0
+        for track in self.tracks:
+            if track.identity is not None and track.identity['id'] in student_ids:
+                track.identity = None
+                track.dist = None
+                track.confident = False
+                track.last_embedded = None
+                cleared += 1
+        return cleared
+
+    def _advance(self, track, box):
+        centre_shift = (box[:2] + box[2:] / 2) - (track.box[:2] + track.box[2:] / 2)
+        gap = max(1, self.frame_no - track.last_seen)
+        # Smooth the velocity estimate to ride out detector jitter
+        track.velocity = 0.5 * track.velocity + 0.5 * (centre_shift / gap)
+        track.box = box
+        track.hits += 1
+        track.last_seen = self.frame_no
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (n, 4) and (m, 4) x/y/w/h boxes."""
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
@@ -1,17 +1,31 @@
 import os
 import base64
-# from deepface import DeepFace # Lazy load instead
+# DeepFace is only imported by app/inference.py (in-process or in the inference service)
 
-from flask import current_app
+from flask import current_app, request
 
 import traceback
 
+def read_uploaded_image():
+    """Image bytes from a multipart 'image' field, or the raw request body."""
+    if request.files:
+        upload = request.files.get('image') or next(iter(request.files.values()))
+        return upload.read()
+    return request.get_data(cache=False)
+
 def save_base64_image(data_url, student_id):
     """Decodes and saves a base64 image."""
     try:
         header, encoded = data_url.split(",", 1)
-        data = base64.b64decode(encoded)
-        
+        return save_image_bytes(base64.b64decode(encoded), student_id)
+    except Exception as e:
+        print(f"Image Save Error: {e}")
+        traceback.print_exc()
+        return None
+
+def save_image_bytes(data, student_id):
+    """Saves an already-encoded JPEG as the student's enrollment image."""
+    try:
         filename = f"student_{student_id}_face.jpg"
         filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         
@@ -29,59 +43,49 @@ def save_base64_image(data_url, student_id):
         return None
 
 def generate_embedding(image_path):
-    """Generates 2622-dim embedding using VGG-Face via DeepFace."""
+    """Generates 2622-dim embedding using VGG-Face via DeepFace.
+
+    Runs on the inference service when one is configured; raises
+    InferenceUnavailable if it is busy so the caller can ask for a retry.
+    Raises QualityRejected for photos that are too dark, blurred, small or
+    turned away; lighting is checked before any model runs, and the face
+    box from a detector-only pass before the embedding model runs.
+    """
+    from app.inference import run_inference, InferenceUnavailable
+    from app.quality import QualityGate, QualityRejected
+    import cv2
+
+    gate = QualityGate.from_config(current_app.config)
+    image = cv2.imread(image_path)
+    if image is None:
+        print(f"ERROR: Could not read image {image_path}")
+        return None
+    reason = gate.check_lighting(image)
+    if reason:
+        raise QualityRejected(f"Photo is {reason}")
+
     try:
-        from deepface import DeepFace
-        print(f"DEBUG: Generating embedding for {image_path}")
-        # returns list of dicts. We take the first face.
-        # returns list of dicts. We take the first face.
-        # enforce_detection=True ensures we don't register bad data.
-        
-        objs = None
-        
-        # 1. Try RetinaFace (Best for Profile/Side Faces)
-        try:
-            print("DEBUG: Attempting detection with RetinaFace...")
-            objs = DeepFace.represent(
-                img_path=image_path, 
-                model_name="VGG-Face", 
-                detector_backend="retinaface",
-                enforce_detection=True,
-                align=True
-            )
-        except Exception as e_retina:
-            print(f"WARNING: RetinaFace failed ({e_retina}). Falling back to SSD.")
-            
-            # 2. Try SSD (Fast, Robust)
-            try:
-                print("DEBUG: Attempting detection with SSD...")
-                objs = DeepFace.represent(
-                    img_path=image_path, 
-                    model_name="VGG-Face", 
-                    detector_backend="ssd",
-                    enforce_detection=True,
-                    align=True
-                )
-            except Exception as e_ssd:
-                print(f"WARNING: SSD failed ({e_ssd}). Falling back to OpenCV.")
-                
-                # 3. Try OpenCV (Basic, Fails on side faces, but works)
-                objs = DeepFace.represent(
-                    img_path=image_path, 
-                    model_name="VGG-Face", 
-                    detector_backend="opencv",
-                    enforce_detection=True,
-                    align=True
-                )
+        # Cheap SSD pass: gate the largest face before paying for RetinaFace + VGG-Face
+        areas = run_inference('locate', image, 'ssd')
+        if areas:
+            area = max(areas, key=lambda a: a['w'] * a['h'])
+            ok, reasons = gate.check(image, [area])
+            if not ok[0]:
+                raise QualityRejected(f"Face is {reasons[0]}")
 
-        if objs:
-            embedding = objs[0]["embedding"]
-            # Ensure it is a list of floats (not numpy array)
-            if hasattr(embedding, "tolist"):
-                embedding = embedding.tolist()
-            return embedding
-            
+        result = run_inference('enroll', image_path)
+    except (InferenceUnavailable, QualityRejected):
+        raise
     except Exception as e:
         print(f"DeepFace Embedding Error: {e}")
         traceback.print_exc()
-    return None
+        return None
+    if not result:
+        return None
+
+    if not areas and result.get('facial_area'):
+        # SSD missed the face (e.g. a profile shot RetinaFace still finds): gate its box instead
+        ok, reasons = gate.check(image, [result['facial_area']])
+        if not ok[0]:
+            raise QualityRejected(f"Face is {reasons[0]}")
+    return result['embedding']
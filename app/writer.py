@@ -0,0 +1,172 @@
+import atexit
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from app.events import publish, publish_attendance
+from app.models import Attendance, UnknownFace, SystemLog
+
+
+class WriteBehindQueue:
+    """Background writer for the inserts the live pipeline produces.
+
+    Attendance, UnknownFace and SystemLog rows from every session are queued
+    and written by one thread in batched transactions, when `max_batch` rows
+    are waiting or `max_delay_ms` after the first one arrived. Frame requests
+    only append to a list, so their latency no longer includes waiting for
+    SQLite's write lock. flush() blocks until everything queued so far is
+    committed; it runs on end_session and at interpreter exit.
+    """
+
+    MODELS = {'attendance': Attendance, 'unknown_face': UnknownFace, 'system_log': SystemLog}
+
+    def __init__(self, app, max_batch=200, max_delay_ms=500, retries=3):
+        self.app = app
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self.retries = retries
+        self._queue = []  # [(kind, row dict)]
+        self._queued_total = 0
+        self._written_total = 0  # rows committed or given up on
+        self._cond = threading.Condition()
+        self._flush_waiters = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    # --- Producers ---
+
+    def add(self, kind, rows):
+        rows = [dict(row) for row in rows]
+        if not rows:
+            return
+        with self._cond:
+            self._queue.extend((kind, row) for row in rows)
+            self._queued_total += len(rows)
+            self._cond.notify_all()
+
+    # Timestamps are taken now, not when the batch is written
+
+    def add_attendance(self, rows):
+        now = datetime.utcnow()
+        self.add('attendance', [dict(row, time_marked=row.get('time_marked') or now) for row in rows])
+
+    def add_unknown_face(self, image_path, camera_id=None):
+        self.add('unknown_face', [{'image_path': image_path, 'camera_id': camera_id, 'timestamp': datetime.utcnow()}])
+
+    def log(self, level, message):
+        self.add('system_log', [{'level': level, 'message': message[:500], 'timestamp': datetime.utcnow()}])
+
+    # --- Control ---
+
+    def flush(self, timeout=10):
+        """Waits until every row queued before this call has been written."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._queued_total
+            self._flush_waiters += 1
+            self._cond.notify_all()  # Skip the batching delay
+            try:
+                while self._written_total < target:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._thread.is_alive():
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def stop(self):
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._queue:
+                    return
+                # Let more rows join the batch unless a flush is waiting
+                deadline = time.monotonic() + self.max_delay
+                while len(self._queue) < self.max_batch and not (self._flush_waiters or self._stopped):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+
+            self._write(batch)
+            with self._cond:
+                self._written_total += len(batch)
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        from app.attendance import insert_attendance, forget_marked
+
+        grouped = {}
+        for kind, row in batch:
+            grouped.setdefault(kind, []).append(row)
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                inserted = set()
+                with self.app.app_context():
+                    for kind, rows in grouped.items():
+                        if kind == 'attendance':
+                            inserted = insert_attendance(rows)
+                        else:
+                            db.session.execute(db.insert(self.MODELS[kind]), rows)
+                    db.session.commit()
+                print(f"DEBUG: Write-behind committed {len(batch)} row(s).")
+                publish_attendance(inserted)
+                for row in grouped.get('unknown_face', []):
+                    publish('unknown_face', camera_id=row.get('camera_id'),
+                            time=row['timestamp'].strftime("%H:%M"))
+                return
+            except Exception as e:
+                print(f"Write-behind Error (attempt {attempt}/{self.retries}): {e}")
+                if attempt == self.retries:
+                    traceback.print_exc()
+                time.sleep(0.1 * attempt)
+
+        # Given up: let the recognizer mark these students again
+        for row in grouped.get('attendance', []):
+            forget_marked(row['session_id'], [row['student_id']])
+
+
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """This app's write-behind queue, or None when WRITE_BEHIND_ENABLED is off."""
+    app = current_app._get_current_object()
+    if not app.config.get('WRITE_BEHIND_ENABLED', True):
+        return None
+    with _writer_lock:
+        if 'write_behind' not in app.extensions:
+            app.extensions['write_behind'] = WriteBehindQueue(
+                app,
+                max_batch=app.config.get('WRITE_BATCH_SIZE', 200),
+                max_delay_ms=app.config.get('WRITE_FLUSH_INTERVAL_MS', 500)
+            )
+        return app.extensions['write_behind']
+
+
+def flush_writes(timeout=10):
+    """Commits everything queued so far (no-op without write-behind)."""
+    writer = current_app.extensions.get('write_behind')
+    return writer.flush(timeout) if writer else True
@@ -0,0 +1,14 @@
+# One-shot migration: (re)build DailyAttendanceRollup from Session and
+# Attendance. Safe to re-run; dashboards read the rollup afterwards.
+# Usage: python backfill_rollup.py
+from app import create_app, db
+from app.attendance import rebuild_rollup
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        groups = rebuild_rollup()
+        db.session.commit()
+        print(f"Rebuilt daily attendance rollup: {groups} day/subject rows.")
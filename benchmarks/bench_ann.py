@@ -0,0 +1,76 @@
+"""IVF (approximate) vs exact gallery search: recall@1 against latency.
+
+Usage: python benchmarks/bench_ann.py [--sizes 20000 100000] [--nprobe 1 2 4 8 16 32]
+
+Synthetic embeddings are drawn around a few hundred cluster centres (faces of
+similar appearance cluster too); queries are noisy copies of gallery rows.
+Recall@1 is the share of queries whose ANN best match (by student id) equals
+the exact one; the index stores its gallery in list order, so row numbers differ.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.gallery import Gallery
+from app.ann_index import IVFIndex
+
+DIM = 2622  # VGG-Face embedding size
+
+
+def synthetic_gallery(rng, size, dim, clusters):
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centres[labels] + 0.8 * rng.standard_normal((size, dim), dtype=np.float32)
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--faces', type=int, default=30, help='queries per frame')
+    parser.add_argument('--dim', type=int, default=DIM)
+    parser.add_argument('--clusters', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        known = synthetic_gallery(rng, size, args.dim, args.clusters)
+        gallery = Gallery(known, [{'id': i} for i in range(size)])
+        picks = rng.integers(0, size, args.faces)
+        targets = known[picks] + 0.5 * rng.standard_normal((args.faces, args.dim), dtype=np.float32)
+
+        start = time.perf_counter()
+        index = IVFIndex.build(gallery)
+        build_s = time.perf_counter() - start
+
+        (exact_idx, _, _, _), exact_ms = timed(lambda: gallery.match(targets), args.repeat)
+        print(f"\nGallery {size} x {args.dim}: {len(index.centroids)} lists, build {build_s:.1f}s")
+        print(f"{'search':>10} | {'ms/frame':>9} | {'speed-up':>8} | {'recall@1':>8}")
+        print("-" * 46)
+        print(f"{'exact':>10} | {exact_ms:>9.2f} | {1.0:>7.1f}x | {1.0:>8.3f}")
+        for nprobe in args.nprobe:
+            if nprobe > len(index.centroids):
+                continue
+            (ann_idx, _, _, _), ann_ms = timed(lambda: index.match(targets, nprobe=nprobe), args.repeat)
+            ann_ids = np.asarray([index.students[i]['id'] for i in ann_idx])
+            recall = float(np.mean(ann_ids == exact_idx))
+            print(f"{'nprobe=' + str(nprobe):>10} | {ann_ms:>9.2f} | {exact_ms / ann_ms:>7.1f}x | {recall:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
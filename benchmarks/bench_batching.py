@@ -0,0 +1,99 @@
+"""Embedding throughput with and without cross-session micro-batching.
+
+Usage: python benchmarks/bench_batching.py [--sessions 1 4 16] [--faces 3] [--seconds 5] [--real]
+
+Each session is a thread that repeatedly embeds one frame's worth of face
+crops, as concurrent process_frame calls do. Three strategies are compared:
+  per-face   one forward pass per face (what DeepFace.represent did)
+  per-frame  one forward pass per frame
+  batched    MicroBatcher: crops from all sessions share forward passes
+--real uses VGG-Face through DeepFace; otherwise a NumPy two-layer proxy
+of similar output size stands in (no TensorFlow needed).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.batching import MicroBatcher
+
+
+def numpy_proxy_model(input_size=(224, 224), hidden=1024, dim=2622, seed=0):
+    rng = np.random.default_rng(seed)
+    pooled = (input_size[0] // 4) * (input_size[1] // 4) * 3
+    w1 = rng.standard_normal((pooled, hidden), dtype=np.float32) / np.sqrt(pooled)
+    w2 = rng.standard_normal((hidden, dim), dtype=np.float32) / np.sqrt(hidden)
+
+    def forward(crops):
+        x = crops[:, ::4, ::4, :].reshape(len(crops), -1)
+        return np.maximum(x @ w1, 0) @ w2
+    return forward
+
+
+def real_model():
+    from app.inference import embed_faces, embedding_input_size
+    return embed_faces, embedding_input_size()
+
+
+def run(strategy, forward, sessions, faces, seconds, input_size, batch_size, latency_ms):
+    crops = np.random.default_rng(1).random((faces,) + tuple(input_size) + (3,), dtype=np.float32)
+    batcher = MicroBatcher(forward, batch_size, latency_ms) if strategy == 'batched' else None
+    counts = [0] * sessions
+    stop = time.monotonic() + seconds
+
+    def session(i):
+        while time.monotonic() < stop:
+            if strategy == 'per-face':
+                for k in range(faces):
+                    forward(crops[k:k + 1])
+            elif strategy == 'per-frame':
+                forward(crops)
+            else:
+                batcher.embed(crops)
+            counts[i] += faces
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--faces', type=int, default=3, help='faces per frame')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--real', action='store_true', help='use VGG-Face via DeepFace')
+    args = parser.parse_args()
+
+    if args.real:
+        forward, input_size = real_model()
+        label = 'VGG-Face'
+    else:
+        input_size = (224, 224)
+        forward = numpy_proxy_model(input_size)
+        label = 'NumPy proxy'
+
+    forward(np.zeros((1,) + input_size + (3,), dtype=np.float32))  # warm-up
+    print(f"Model: {label}, {args.faces} faces/frame, batch<={args.batch_size}, wait<={args.latency_ms}ms")
+    print(f"{'sessions':>8} | {'per-face':>10} | {'per-frame':>10} | {'batched':>10}   (faces/sec)")
+    print("-" * 52)
+    for sessions in args.sessions:
+        rates = [run(strategy, forward, sessions, args.faces, args.seconds, input_size,
+                     args.batch_size, args.latency_ms)
+                 for strategy in ('per-face', 'per-frame', 'batched')]
+        print(f"{sessions:>8} | {rates[0]:>10.0f} | {rates[1]:>10.0f} | {rates[2]:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Concurrent read/write throughput of SQLite: default vs production profile.
+
+Usage: python benchmarks/bench_db_concurrency.py [--readers 8] [--writers 4] [--seconds 5] [--rows 20000]
+
+Writers insert one Attendance row per transaction, like live sessions that
+commit per frame; readers run the dashboard's "present today" count. Each
+profile gets a fresh database in a temp directory, seeded with --rows rows.
+
+default     Config: rollback journal, synchronous=FULL, SQLAlchemy's default pool
+production  ProductionConfig: WAL, synchronous=NORMAL, page cache, mmap,
+            busy timeout and the tuned pool
+Failed operations are those that raised (e.g. "database is locked").
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, insert, select
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config, ProductionConfig, engine_options
+from app import db
+from app.database import apply_sqlite_pragmas
+from app.models import Attendance
+
+
+def make_engine(path, profile):
+    uri = 'sqlite:///' + path
+    if profile == 'production':
+        engine = create_engine(uri, **engine_options(uri, ProductionConfig.DB_POOL_SIZE,
+                                                     ProductionConfig.DB_MAX_OVERFLOW))
+        apply_sqlite_pragmas(engine, ProductionConfig.SQLITE_PRAGMAS)
+    else:
+        engine = create_engine(uri, **getattr(Config, 'SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return engine
+
+
+def seed(engine, rows):
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Attendance), [
+            {'student_id': i, 'session_id': 1, 'status': 'Present', 'time_marked': now}
+            for i in range(rows)
+        ])
+
+
+def run(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, 'bench.db'), profile)
+        seed(engine, args.rows)
+        counts = {'reads': 0, 'writes': 0, 'failed': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+        next_student = [args.rows]
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        query = select(func.count(Attendance.id)).where(
+            Attendance.time_marked >= today, Attendance.status == 'Present'
+        )
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(query).scalar()
+                    key = 'reads'
+                except Exception:
+                    key = 'failed'
+                with lock:
+                    counts[key] += 1
+
+        def writer():
+            while not stop.is_set():
+                with lock:
+                    student_id = next_student[0]
+                    next_student[0] += 1
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(Attendance), [{
+                            'student_id': student_id, 'session_id': 1,
+                            'status': 'Present', 'time_marked': datetime.utcnow()
+                        }])
+                    key = 'writes'
+                except Exception:
+                    key = 'failed'
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    print(f"{profile:>10} | {counts['reads'] / elapsed:>10.0f} | {counts['writes'] / elapsed:>10.0f} | "
+          f"{counts['failed']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=20000, help='attendance rows seeded before the run')
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile")
+    print(f"{'profile':>10} | {'reads/s':>10} | {'writes/s':>10} | {'failed':>6}")
+    print("-" * 46)
+    for profile in ('default', 'production'):
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
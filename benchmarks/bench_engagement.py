@@ -0,0 +1,157 @@
+"""Time of a full engagement recompute (app/engagement.py) on synthetic data.
+
+Usage: python benchmarks/bench_engagement.py [--students 20000] [--class-size 60] [--subjects-per-class 6] [--sessions 48] [--end-to-end]
+
+Students are split into classes of --class-size; every class has
+--subjects-per-class subjects with --sessions ended sessions each (a
+semester of twice-weekly classes by default), and each student attends
+with a personal probability between 50% and 100%.
+
+By default only compute_engagement is timed, on in-memory DataFrames. With
+--end-to-end the same data is written to a SQLite database in a temp
+directory (ProductionConfig PRAGMAs, Present and Absent rows as end_session
+leaves them) and refresh_engagement is timed as refresh_engagement.py runs
+it: loading, computing, replacing StudentEngagement and committing.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ProductionConfig
+from app import create_app, db
+from app.engagement import compute_engagement, load_engagement_inputs, refresh_engagement
+from app.models import Attendance, Faculty, Session, Student, Subject, User
+
+
+def synthetic_inputs(students, class_size, subjects_per_class, sessions_per_subject, seed=0):
+    """sessions, roster and marks (one Present/Absent row per expected pair); ids start at 1."""
+    rng = np.random.default_rng(seed)
+    classes = (students + class_size - 1) // class_size
+    student_ids = np.arange(1, students + 1)
+    roster = pd.DataFrame({
+        'student_id': student_ids,
+        'class_name': [f"C{k}" for k in (student_ids - 1) // class_size]
+    })
+
+    subject_ids = np.arange(1, classes * subjects_per_class + 1)
+    session_subject = np.repeat(subject_ids, sessions_per_subject)
+    day = np.tile(np.arange(sessions_per_subject), len(subject_ids))
+    start = date(2026, 1, 5)
+    sessions = pd.DataFrame({
+        'session_id': np.arange(1, len(session_subject) + 1),
+        'subject_id': session_subject,
+        'class_name': [f"C{k}" for k in (session_subject - 1) // subjects_per_class],
+        'date': [start + timedelta(days=int(d) * 3) for d in day],
+        'start_time': dtime(9, 0)
+    })
+
+    # Expected (student, session) pairs, marked by each student's attendance rate
+    rate = rng.uniform(0.5, 1.0, students)
+    marks = sessions[['session_id', 'class_name']].merge(roster, on='class_name')
+    present = rng.random(len(marks)) < rate[marks['student_id'].to_numpy() - 1]
+    marks = marks[['student_id', 'session_id']].assign(status=np.where(present, 'Present', 'Absent'))
+    return sessions, roster, marks
+
+
+class BenchConfig(ProductionConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'engagement.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    GALLERY_VERSION_FILE = None
+    PRELOAD_MODELS = False
+    WRITE_BEHIND_ENABLED = False
+
+
+def insert_rows(model, frame, chunk=50000):
+    records = frame.to_dict('records')
+    for start in range(0, len(records), chunk):
+        db.session.execute(db.insert(model), records[start:start + chunk])
+
+
+def seed_database(sessions, roster, marks):
+    db.create_all()
+    students = len(roster)
+    insert_rows(User, pd.DataFrame({
+        'id': np.arange(1, students + 2),
+        'name': 'Bench',
+        'email': [f"u{i}@bench" for i in range(1, students + 2)],
+        'password_hash': '-',
+        'role': ['student'] * students + ['faculty']
+    }))
+    insert_rows(Faculty, pd.DataFrame({'id': [1], 'user_id': [students + 1], 'department': ['CS']}))
+    insert_rows(Student, roster.rename(columns={'student_id': 'id'}).assign(
+        user_id=roster['student_id'], roll_no=roster['student_id'].astype(str), department='CS'
+    ))
+    subjects = sessions.drop_duplicates('subject_id')
+    insert_rows(Subject, pd.DataFrame({
+        'id': subjects['subject_id'], 'name': 'Subject', 'code': 'S', 'class_name': subjects['class_name'],
+        'faculty_id': 1
+    }))
+    insert_rows(Session, sessions.rename(columns={'session_id': 'id'})
+                .drop(columns='class_name').assign(is_active=False))
+    insert_rows(Attendance, marks.assign(time_marked=datetime(2026, 1, 5, 9, 0)))
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+
+
+def time_it(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings), np.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--class-size', type=int, default=60)
+    parser.add_argument('--subjects-per-class', type=int, default=6)
+    parser.add_argument('--sessions', type=int, default=48, help='sessions per subject')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--end-to-end', action='store_true', help='time refresh_engagement on a seeded SQLite DB')
+    args = parser.parse_args()
+
+    sessions, roster, marks = synthetic_inputs(
+        args.students, args.class_size, args.subjects_per_class, args.sessions
+    )
+    attendance = marks.loc[marks['status'] == 'Present', ['student_id', 'session_id']]
+    print(f"{args.students} students, {len(sessions)} sessions, {len(marks)} attendance rows "
+          f"({len(attendance)} present), {len(sessions) // args.sessions} subjects")
+
+    result, best, mean = time_it(lambda: compute_engagement(sessions, roster, attendance), args.repeat)
+    print(f"compute_engagement: best {best:.2f}s, mean {mean:.2f}s over {args.repeat} runs")
+    print(f"{len(result)} student/subject rows, {result['at_risk'].sum()} at risk, "
+          f"{result.loc[result['at_risk'], 'student_id'].nunique()} students at risk")
+
+    if not args.end_to_end:
+        return
+    app = create_app(BenchConfig)
+    with app.app_context():
+        start = time.perf_counter()
+        seed_database(sessions, roster, marks)
+        print(f"\nSeeded {BenchConfig.SQLALCHEMY_DATABASE_URI} in {time.perf_counter() - start:.1f}s")
+
+        _, best, mean = time_it(load_engagement_inputs, args.repeat)
+        print(f"load_engagement_inputs: best {best:.2f}s, mean {mean:.2f}s over {args.repeat} runs")
+
+        def refresh():
+            rows = refresh_engagement(app.config)
+            db.session.commit()
+            return rows
+        rows, best, mean = time_it(refresh, args.repeat)
+        print(f"refresh_engagement + commit: best {best:.2f}s, mean {mean:.2f}s over {args.repeat} runs "
+              f"({rows} rows written)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Per-stage time of the recognition path: single- vs two-resolution.
+
+Usage: python benchmarks/bench_pipeline.py [--width 1280] [--faces 6] [--downscale 2] [--repeat 50] [--real [--image photo.jpg]]
+
+single   the old path: the client sends an 800px JPEG, which is decoded,
+         detected on and cropped at that size
+two-res  the client sends the full frame; it is decoded at 1/downscale for
+         detection and decoded in full only to cut the face crops
+Stages: decode (detection level), detect, full decode, crop+align.
+--real runs SSD through DeepFace on the frame; otherwise "detect" times
+only the detector's input preparation (resize to 300x300 + blob), which
+is the part that depends on the frame size. Face boxes are synthetic.
+The last column is the face crop's side in source pixels before it is
+resized to 224x224 -- larger means more detail for VGG-Face.
+
+Parity (--real --image): embeds the faces of a real photo both ways --
+SSD boxes -> crop_faces -> embed_faces (the live path) and
+DeepFace.represent with SSD and alignment (how students are enrolled) --
+and prints the cosine distance between the two embeddings of each face.
+It should stay well below FACE_MATCH_THRESHOLD.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.frames import FrameSource, crop_faces
+from app.tracking import iou_matrix
+
+
+def synthetic_jpeg(width, height, seed=0):
+    # Smooth noise compresses like a camera frame, unlike white noise
+    rng = np.random.default_rng(seed)
+    small = (rng.random((height // 16, width // 16, 3)) * 255).astype(np.uint8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return buf.tobytes()
+
+
+def face_boxes(width, height, faces, face_frac=0.05):
+    # Back-row sized faces spread across the frame, with a slight head tilt
+    side = int(width * face_frac)
+    boxes = []
+    for k in range(faces):
+        x = int((k + 0.5) * width / faces - side / 2)
+        y = int(height * 0.4)
+        boxes.append({'x': x, 'y': y, 'w': side, 'h': side,
+                      'left_eye': (x + side * 0.7, y + side * 0.38),
+                      'right_eye': (x + side * 0.3, y + side * 0.35)})
+    return boxes
+
+
+def make_detector(real):
+    if real:
+        from app.inference import locate_faces
+        return lambda frame: locate_faces(frame, 'ssd')
+
+    def proxy(frame):
+        resized = cv2.resize(frame, (300, 300))
+        return cv2.dnn.blobFromImage(resized, 1.0, (300, 300), (104.0, 177.0, 123.0))
+    return proxy
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def run(label, data, downscale, boxes, detect, repeat):
+    decode_ms, source = timed(lambda: FrameSource.from_jpeg(data, downscale), repeat)
+    detect_ms, _ = timed(lambda: detect(source.detect), repeat)
+    full_ms, _ = timed(lambda: FrameSource.from_jpeg(data, downscale).full, repeat)
+    full_ms = max(0.0, full_ms - decode_ms) if downscale > 1 else 0.0
+    frame = source.full
+    crop_ms, _ = timed(lambda: crop_faces(frame, boxes), repeat)
+    total = decode_ms + detect_ms + full_ms + crop_ms
+    shape = f"{source.detect.shape[1]}x{source.detect.shape[0]}"
+    print(f"{label:>8} | {shape:>10} | {decode_ms:>8.2f} | {detect_ms:>8.2f} | {full_ms:>9.2f} | "
+          f"{crop_ms:>8.2f} | {total:>8.2f} | {boxes[0]['w']:>5}px")
+
+
+def box_array(areas):
+    return np.asarray([[a['x'], a['y'], a['w'], a['h']] for a in areas], dtype=np.float32).reshape(-1, 4)
+
+
+def cosine_distance(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return 1.0 - float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def parity(image_path, threshold):
+    from deepface import DeepFace
+    from app.inference import EMBEDDING_MODEL, embed_faces, locate_faces
+
+    frame = cv2.imread(image_path)
+    if frame is None:
+        sys.exit(f"Could not read {image_path}")
+    areas = locate_faces(frame, 'ssd')
+    ours = embed_faces(crop_faces(frame, areas))
+    reference = [obj for obj in DeepFace.represent(img_path=frame, model_name=EMBEDDING_MODEL,
+                                                   detector_backend='ssd', enforce_detection=False, align=True)
+                 if obj.get('face_confidence', 1) > 0]
+    print(f"\nParity on {image_path}: {len(areas)} face(s) located, {len(reference)} from DeepFace.represent")
+    if not areas or not reference:
+        return
+
+    # Pair faces by box overlap; both sides run the same SSD detector
+    overlap = iou_matrix(box_array(areas), box_array([obj['facial_area'] for obj in reference]))
+    distances = []
+    for i, area in enumerate(areas):
+        j = int(np.argmax(overlap[i]))
+        if overlap[i, j] < 0.5:
+            print(f"face {i} at ({area['x']}, {area['y']}): no matching DeepFace box")
+            continue
+        dist = cosine_distance(ours[i], reference[j]['embedding'])
+        distances.append(dist)
+        print(f"face {i} at ({area['x']}, {area['y']}) {area['w']}x{area['h']}: cosine distance {dist:.4f}")
+    if distances:
+        print(f"mean {np.mean(distances):.4f}, max {np.max(distances):.4f} "
+              f"(FACE_MATCH_THRESHOLD {threshold})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=1280, help='camera frame width')
+    parser.add_argument('--single-width', type=int, default=800, help='old client send width')
+    parser.add_argument('--faces', type=int, default=6)
+    parser.add_argument('--downscale', type=int, default=2, choices=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--real', action='store_true', help='run SSD via DeepFace')
+    parser.add_argument('--image', help='photo with faces for the --real embedding parity check')
+    args = parser.parse_args()
+
+    height = args.width * 9 // 16
+    single_height = args.single_width * 9 // 16
+    detect = make_detector(args.real)
+    print(f"Detector: {'SSD (DeepFace)' if args.real else 'input preparation only'}, "
+          f"{args.faces} faces, {args.repeat} runs (ms per frame)")
+    print(f"{'path':>8} | {'detect at':>10} | {'decode':>8} | {'detect':>8} | {'full dec.':>9} | "
+          f"{'crops':>8} | {'total':>8} | {'face':>7}")
+    print("-" * 86)
+    run('single', synthetic_jpeg(args.single_width, single_height), 1,
+        face_boxes(args.single_width, single_height, args.faces), detect, args.repeat)
+    run('two-res', synthetic_jpeg(args.width, height), args.downscale,
+        face_boxes(args.width, height, args.faces), detect, args.repeat)
+
+    if args.real and args.image:
+        from config import Config
+        parity(args.image, Config.FACE_MATCH_THRESHOLD)
+    elif args.real:
+        print("\nParity check skipped: pass --image with a photo of real faces")
+
+
+if __name__ == '__main__':
+    main()
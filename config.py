@@ -1,5 +1,31 @@
 import os
 
+
+def engine_options(uri, pool_size=10, max_overflow=20, pool_timeout=30):
+    """SQLALCHEMY_ENGINE_OPTIONS for a DATABASE_URL.
+
+    Server databases get pre-ping and recycling so connections the server
+    dropped are replaced. SQLite files get the same pool plus a driver-level
+    lock timeout; in-memory SQLite is pinned to one connection by SQLAlchemy.
+    """
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': pool_timeout,
+            'connect_args': {'timeout': 15}
+        }
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
+
+
 class Config:
     # Key for session security
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'super-secret-key-change-in-production-12345'
@@ -10,6 +36,7 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = {} # Connect-time PRAGMAs for SQLite (see ProductionConfig)
     
     # Uploads
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'faces')
@@ -18,3 +45,130 @@ class Config:
     # AI Performance Tuning
     # Higher = stricter match. 0.40 is standard for VGG-Face + Euclidean L2
     FACE_MATCH_THRESHOLD = 0.50 
+
+    # Session galleries only hold the subject's class. When a face has no match
+    # there, optionally widen the search: None, 'department' or 'campus'.
+    GALLERY_FALLBACK_SCOPE = os.environ.get('GALLERY_FALLBACK_SCOPE') or None
+
+    # Gallery invalidation: touched on every FaceData change, polled cheaply per frame.
+    # The DB is re-checked at least this often for writers on other hosts.
+    GALLERY_VERSION_FILE = os.path.join(basedir, 'instance', 'gallery.version')
+    GALLERY_VERSION_POLL_SECONDS = 30
+
+    # FaceData.embedding_blob precision: 'float32' (exact) or 'float16' (half the size)
+    EMBEDDING_STORAGE_DTYPE = os.environ.get('EMBEDDING_STORAGE_DTYPE') or 'float32'
+
+    # Memory-mapped gallery files shared by every worker on this host (empty = per-process only)
+    GALLERY_STORE_DIR = os.environ.get('GALLERY_STORE_DIR', os.path.join(basedir, 'instance', 'galleries'))
+
+    # Approximate search (IVF, NumPy only) for galleries too big for exact search,
+    # e.g. campus-wide fallback. NPROBE trades recall for latency.
+    ANN_ENABLED = os.environ.get('ANN_ENABLED', '').lower() in ('1', 'true', 'yes')
+    ANN_MIN_GALLERY_SIZE = 20000
+    ANN_LISTS = None # Default: sqrt(gallery size)
+    ANN_NPROBE = 8
+    ANN_INDEX_DIR = os.path.join(basedir, 'instance', 'ann')
+
+    # Model warm-up: load VGG-Face and detectors when each web worker starts
+    # (gunicorn.conf.py's post_worker_init, or run.py) instead of on the first
+    # frame. Each worker holds its own copy; to share one, run inference_server.py.
+    PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '').lower() in ('1', 'true', 'yes')
+    PRELOAD_DETECTORS = ('ssd',)
+
+    # Inference service (inference_server.py). Empty address = run models inside
+    # the web worker. e.g. INFERENCE_SERVICE_ADDRESS=instance/inference.sock
+    INFERENCE_SERVICE_ADDRESS = os.environ.get('INFERENCE_SERVICE_ADDRESS') or None
+    INFERENCE_SERVICE_AUTHKEY = os.environ.get('INFERENCE_SERVICE_AUTHKEY') # Required for host:port; Unix sockets default to SECRET_KEY
+    INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 2))
+    INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', 8))
+    INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 10)) # Seconds a request waits
+    # Threads per model process; workers x intra-op threads ~= cores
+    INFERENCE_INTRA_OP_THREADS = int(os.environ.get('INFERENCE_INTRA_OP_THREADS', 0)) or None
+    INFERENCE_INTER_OP_THREADS = int(os.environ.get('INFERENCE_INTER_OP_THREADS', 0)) or None
+
+    # Micro-batching: faces from concurrent frames wait up to this long to share
+    # one VGG-Face forward pass (applies in-process and in the inference service)
+    EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', 32))
+    EMBED_BATCH_LATENCY_MS = float(os.environ.get('EMBED_BATCH_LATENCY_MS', 5))
+
+    # Face tracking across frames: confidently identified faces (distance below
+    # TRACK_CONFIDENT_DIST) keep their identity and are only re-embedded every
+    # TRACK_REVERIFY_FRAMES frames; unknown faces are retried every N frames
+    TRACK_IOU_THRESHOLD = 0.3
+    TRACK_REVERIFY_FRAMES = int(os.environ.get('TRACK_REVERIFY_FRAMES', 10))
+    TRACK_UNKNOWN_RETRY_FRAMES = 1
+    TRACK_MAX_MISSED_FRAMES = 5 # Frames a face may vanish before its track is dropped
+    TRACK_CONFIDENT_DIST = 0.45
+
+    # Motion gate: a frame where fewer than MOTION_MIN_CHANGED_FRACTION of the
+    # thumbnail pixels changed by more than MOTION_PIXEL_DELTA grey levels reuses
+    # the previous detections. Inference still runs at least every MOTION_MAX_SKIP_SECONDS.
+    MOTION_PIXEL_DELTA = 12
+    MOTION_MIN_CHANGED_FRACTION = float(os.environ.get('MOTION_MIN_CHANGED_FRACTION', 0.005))
+    MOTION_MAX_SKIP_SECONDS = float(os.environ.get('MOTION_MAX_SKIP_SECONDS', 5))
+
+    # Live session WebSocket (needs flask-sock). The server sends 'ready' when it
+    # wants the next frame, no sooner than this interval; is_active is re-checked
+    # every STREAM_SESSION_CHECK_SECONDS instead of per frame
+    STREAM_MIN_FRAME_INTERVAL_MS = int(os.environ.get('STREAM_MIN_FRAME_INTERVAL_MS', 250))
+    STREAM_BUSY_RETRY_MS = 500
+    STREAM_SESSION_CHECK_SECONDS = 10
+
+    # Two-resolution recognition: SSD runs on the upload shrunk by this factor
+    # (JPEGs are decoded directly at 1/2, 1/4 or 1/8), VGG-Face crops come from
+    # the full-resolution frame. 1 = detect at full resolution.
+    DETECT_DOWNSCALE = int(os.environ.get('DETECT_DOWNSCALE', 2))
+
+    # Face quality gate, applied before VGG-Face in live sessions and to
+    # enrollment photos. Size in pixels, sharpness = Laplacian variance of a
+    # 64x64 grey patch, brightness = mean grey level, yaw 0 (frontal) .. 1
+    QUALITY_MIN_FACE_SIZE = int(os.environ.get('QUALITY_MIN_FACE_SIZE', 40))
+    QUALITY_MIN_SHARPNESS = float(os.environ.get('QUALITY_MIN_SHARPNESS', 30))
+    QUALITY_MIN_BRIGHTNESS = 40
+    QUALITY_MAX_BRIGHTNESS = 220
+    QUALITY_MAX_YAW = 0.45
+
+    # Write-behind: Attendance/UnknownFace/SystemLog inserts from live sessions are
+    # committed by a background thread in batches of up to WRITE_BATCH_SIZE rows,
+    # at most WRITE_FLUSH_INTERVAL_MS after they were queued
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    WRITE_BATCH_SIZE = 200
+    WRITE_FLUSH_INTERVAL_MS = int(os.environ.get('WRITE_FLUSH_INTERVAL_MS', 500))
+
+    # /api/dashboard/stats is computed at most once per interval per worker and
+    # shared by every open dashboard (unchanged polls get 304 Not Modified)
+    DASHBOARD_STATS_TTL_SECONDS = float(os.environ.get('DASHBOARD_STATS_TTL_SECONDS', 5))
+
+    # gthread threads per gunicorn worker (gunicorn.conf.py reads the same
+    # WEB_THREADS). Live-session WebSockets each hold one of them for as long
+    # as they stay connected; dashboards poll /api/dashboard/stats instead.
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 16))
+
+    # Engagement scores (recomputed per subject when a session ends, or for all
+    # subjects with refresh_engagement.py): a student is at risk in a subject
+    # once ENGAGEMENT_MIN_SESSIONS were held and their attendance ratio is below
+    # ENGAGEMENT_MIN_RATIO or they missed the last N sessions in a row
+    ENGAGEMENT_MIN_RATIO = float(os.environ.get('ENGAGEMENT_MIN_RATIO', 0.75))
+    ENGAGEMENT_MAX_ABSENCE_STREAK = 3
+    ENGAGEMENT_MIN_SESSIONS = 3
+
+
+class ProductionConfig(Config):
+    # SQLite tuned for concurrent readers and writers: WAL journal, NORMAL sync,
+    # 64 MB page cache, 256 MB mmap and a 15 s busy timeout on every connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000, # Negative = KiB
+        'mmap_size': 268435456,
+        'busy_timeout': 15000,
+        'temp_store': 'MEMORY'
+    }
+
+    # Connection pool per worker process, for SQLite and server databases alike
+    # (see engine_options above)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        Config.SQLALCHEMY_DATABASE_URI, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+    )
@@ -0,0 +1,21 @@
+# One-shot cleanup: remove duplicate Attendance rows so the unique
+# (student_id, session_id) constraint can be added with `flask db upgrade`.
+# Usage: python dedupe_attendance.py
+from app import create_app, db
+from app.models import Attendance
+
+app = create_app()
+
+def remove_duplicates():
+    # Keep the earliest row of each pair (first recognition wins)
+    keep = db.session.query(db.func.min(Attendance.id)) \
+        .group_by(Attendance.student_id, Attendance.session_id)
+    removed = Attendance.query.filter(Attendance.id.notin_(keep)).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+if __name__ == '__main__':
+    with app.app_context():
+        removed = remove_duplicates()
+        print(f"Removed {removed} duplicate attendance rows.")
+        print("Now run `flask db upgrade` to enforce one row per student and session.")
@@ -0,0 +1,13 @@
+# Gunicorn settings (Procfile: gunicorn -c gunicorn.conf.py wsgi:app)
+import os
+
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16)) # Same variable as Config.WEB_THREADS
+
+
+def post_worker_init(worker):
+    # PRELOAD_MODELS warm-up happens here, in each worker after the fork, and
+    # never in the master: TensorFlow's runtime is not fork-safe, so don't add
+    # --preload with models loaded at import time
+    from app.inference import warm_up_worker
+    warm_up_worker(worker.wsgi.config)
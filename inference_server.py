@@ -0,0 +1,44 @@
+# Local inference service: owns the face models so web workers don't.
+# Usage: python inference_server.py
+# Then set INFERENCE_SERVICE_ADDRESS (same value as here) for the web app.
+import numpy as np
+
+# PATCH: Restore deprecated aliases for TensorFlow 2.5 compat with NumPy 1.20+
+# (at module level so spawned pool workers, which re-import this file, get it too)
+try:
+    if not hasattr(np, 'object'):
+        np.object = object
+    if not hasattr(np, 'bool'):
+        np.bool = bool
+    if not hasattr(np, 'int'):
+        np.int = int
+    if not hasattr(np, 'float'):
+        np.float = float
+    if not hasattr(np, 'typeDict'):
+        np.typeDict = np.sctypeDict
+except Exception as e:
+    print(f"NumPy Patch Error: {e}")
+
+import os
+from config import Config
+
+if __name__ == '__main__':
+    from app.inference import service_authkey
+    from app.inference_service import InferenceService
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    address = config.get('INFERENCE_SERVICE_ADDRESS') or os.path.join(Config.basedir, 'instance', 'inference.sock')
+
+    service = InferenceService(
+        address,
+        service_authkey(config, address),
+        workers=config['INFERENCE_WORKERS'],
+        queue_size=config['INFERENCE_QUEUE_SIZE'],
+        intra_op=config['INFERENCE_INTRA_OP_THREADS'],
+        inter_op=config['INFERENCE_INTER_OP_THREADS'],
+        detectors=config['PRELOAD_DETECTORS'],
+        batch_size=config['EMBED_BATCH_SIZE'],
+        batch_latency_ms=config['EMBED_BATCH_LATENCY_MS']
+    )
+    service.warm_up()
+    service.serve_forever()
@@ -0,0 +1,39 @@
+# One-shot backfill: FaceData.embedding JSON text -> embedding_blob raw vectors.
+# The columns come from the migrations: run `flask db upgrade` first.
+# Usage: python migrate_embeddings.py [float32|float16]
+import sys
+from app import create_app, db
+from app.models import FaceData, EMBEDDING_DTYPES
+
+app = create_app()
+
+def has_blob_columns():
+    columns = {c['name'] for c in db.inspect(db.engine).get_columns('face_data')}
+    return {'embedding_blob', 'embedding_dtype'} <= columns
+
+def convert_rows(dtype, batch_size=500):
+    converted = 0
+    while True:
+        rows = FaceData.query.filter(FaceData.embedding_blob.is_(None), FaceData.embedding != '') \
+            .limit(batch_size).all()
+        if not rows:
+            break
+        for face_data in rows:
+            face_data.set_embedding(face_data.get_embedding(), dtype=dtype)
+        db.session.commit()
+        converted += len(rows)
+        print(f"   Converted {converted} rows...")
+    return converted
+
+if __name__ == '__main__':
+    dtype = sys.argv[1] if len(sys.argv) > 1 else app.config.get('EMBEDDING_STORAGE_DTYPE', 'float32')
+    if dtype not in EMBEDDING_DTYPES:
+        print(f"ERROR: dtype must be one of {EMBEDDING_DTYPES}")
+        sys.exit(1)
+
+    with app.app_context():
+        if not has_blob_columns():
+            print("ERROR: face_data has no embedding_blob column yet. Run `flask db upgrade` first.")
+            sys.exit(1)
+        total = convert_rows(dtype)
+        print(f"Embedding migration complete: {total} rows stored as {dtype}.")
@@ -0,0 +1,40 @@
+"""Indexes for hot attendance, session and unknown-face queries
+
+Tables are created by db.create_all(), which already builds these indexes on
+new databases; this revision adds them to databases created before them.
+IF NOT EXISTS keeps it safe to run against either.
+
+Revision ID: 3f1c2a9d8e47
+Revises:
+Create Date: 2026-10-18 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8e47'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_attendance_session_student', 'attendance', ['session_id', 'student_id']),
+    ('ix_attendance_student_time', 'attendance', ['student_id', 'time_marked']),
+    ('ix_attendance_time_marked', 'attendance', ['time_marked']),
+    ('ix_session_date', 'session', ['date']),
+    ('ix_session_subject_date', 'session', ['subject_id', 'date']),
+    ('ix_unknown_face_timestamp', 'unknown_face', ['timestamp']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
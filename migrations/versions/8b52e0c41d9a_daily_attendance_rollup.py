@@ -0,0 +1,40 @@
+"""Daily attendance rollup table
+
+Fill it on existing databases with backfill_rollup.py.
+
+Revision ID: 8b52e0c41d9a
+Revises: 3f1c2a9d8e47
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b52e0c41d9a'
+down_revision = '3f1c2a9d8e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_attendance_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('class_name', sa.String(length=50), nullable=False),
+        sa.Column('sessions', sa.Integer(), nullable=False),
+        sa.Column('present', sa.Integer(), nullable=False),
+        sa.Column('late', sa.Integer(), nullable=False),
+        sa.Column('absent', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'subject_id', 'class_name', name='uq_rollup_day_subject_class'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('daily_attendance_rollup', if_exists=True)
@@ -0,0 +1,47 @@
+"""Student engagement table
+
+Fill it on existing databases with refresh_engagement.py.
+
+Revision ID: c7d41f2b9e03
+Revises: 8b52e0c41d9a
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d41f2b9e03'
+down_revision = '8b52e0c41d9a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'student_engagement',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('sessions_held', sa.Integer(), nullable=False),
+        sa.Column('attended', sa.Integer(), nullable=False),
+        sa.Column('attendance_ratio', sa.Float(), nullable=False),
+        sa.Column('absence_streak', sa.Integer(), nullable=False),
+        sa.Column('longest_absence_streak', sa.Integer(), nullable=False),
+        sa.Column('at_risk', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('student_id', 'subject_id', name='uq_engagement_student_subject'),
+        if_not_exists=True
+    )
+    op.create_index('ix_engagement_at_risk', 'student_engagement', ['at_risk', 'student_id'], if_not_exists=True)
+    op.create_index('ix_engagement_subject', 'student_engagement', ['subject_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_engagement_subject', table_name='student_engagement', if_exists=True)
+    op.drop_index('ix_engagement_at_risk', table_name='student_engagement', if_exists=True)
+    op.drop_table('student_engagement', if_exists=True)
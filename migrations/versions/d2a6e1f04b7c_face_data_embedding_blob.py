@@ -0,0 +1,60 @@
+"""Raw embedding columns on face_data
+
+Convert the existing JSON embeddings afterwards with migrate_embeddings.py.
+Databases built by db.create_all() after the change already have the
+columns, so they are only added when missing.
+
+Revision ID: d2a6e1f04b7c
+Revises: c7d41f2b9e03
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6e1f04b7c'
+down_revision = 'c7d41f2b9e03'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('embedding_blob', sa.LargeBinary()),
+    ('embedding_dtype', sa.String(length=10)),
+]
+
+
+def _existing_columns():
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns('face_data')}
+
+
+def upgrade():
+    existing = _existing_columns()
+    for name, type_ in COLUMNS:
+        if name not in existing:
+            op.add_column('face_data', sa.Column(name, type_, nullable=True))
+
+
+def downgrade():
+    existing = _existing_columns()
+    if 'embedding_blob' in existing:
+        # Put converted vectors back into the JSON column before the bytes go
+        conn = op.get_bind()
+        rows = conn.execute(sa.text(
+            "SELECT id, embedding_blob, embedding_dtype FROM face_data "
+            "WHERE embedding_blob IS NOT NULL AND (embedding IS NULL OR embedding = '')"
+        )).all()
+        for row_id, blob, dtype in rows:
+            vector = np.frombuffer(blob, dtype=np.dtype(dtype or 'float32').newbyteorder('<'))
+            conn.execute(sa.text("UPDATE face_data SET embedding = :embedding WHERE id = :id"),
+                         {'embedding': json.dumps(vector.astype(float).tolist()), 'id': row_id})
+
+    with op.batch_alter_table('face_data') as batch_op:
+        for name, _ in reversed(COLUMNS):
+            if name in existing:
+                batch_op.drop_column(name)
@@ -0,0 +1,60 @@
+"""One attendance row per (student_id, session_id)
+
+Remove existing duplicates with dedupe_attendance.py before upgrading.
+Databases built by db.create_all() after the change already carry the
+constraint; older ones get an equivalent unique index.
+
+Revision ID: e5b93c7a1d20
+Revises: d2a6e1f04b7c
+Create Date: 2026-10-18 21:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b93c7a1d20'
+down_revision = 'd2a6e1f04b7c'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'uq_attendance_student_session'
+PAIR = ['student_id', 'session_id']
+
+
+def _unique_pair():
+    """('constraint' | 'index', name) enforcing the pair, or None."""
+    inspector = sa.inspect(op.get_bind())
+    for constraint in inspector.get_unique_constraints('attendance'):
+        if set(constraint['column_names']) == set(PAIR):
+            return 'constraint', constraint['name']
+    for index in inspector.get_indexes('attendance'):
+        if index.get('unique') and set(index['column_names']) == set(PAIR):
+            return 'index', index['name']
+    return None
+
+
+def upgrade():
+    if _unique_pair():
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM attendance GROUP BY student_id, session_id HAVING COUNT(*) > 1) d"
+    )).scalar()
+    if duplicates:
+        raise RuntimeError(f"{duplicates} (student, session) pairs have duplicate attendance rows; "
+                           "run dedupe_attendance.py, then upgrade again")
+    op.create_index(NAME, 'attendance', PAIR, unique=True)
+
+
+def downgrade():
+    found = _unique_pair()
+    if found is None:
+        return
+    kind, name = found
+    if kind == 'index':
+        op.drop_index(name, table_name='attendance')
+    else:
+        with op.batch_alter_table('attendance') as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
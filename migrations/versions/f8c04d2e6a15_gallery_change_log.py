@@ -0,0 +1,34 @@
+"""Gallery change log table
+
+Needs no backfill: an empty log is version 0, and session galleries are
+loaded in full the first time they are built.
+
+Revision ID: f8c04d2e6a15
+Revises: e5b93c7a1d20
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8c04d2e6a15'
+down_revision = 'e5b93c7a1d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gallery_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('gallery_change', if_exists=True)
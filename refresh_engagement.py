@@ -0,0 +1,18 @@
+# Recompute StudentEngagement (attendance ratios, absence streaks, at-risk
+# flags) for every subject. Sessions refresh their own subject when they end;
+# run this after bulk edits or from a nightly cron job.
+# Usage: python refresh_engagement.py
+import time
+
+from app import create_app, db
+from app.engagement import refresh_engagement
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        start = time.time()
+        rows = refresh_engagement(app.config)
+        db.session.commit()
+        print(f"Engagement refreshed: {rows} student/subject rows in {time.time() - start:.1f}s.")
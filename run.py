@@ -52,5 +52,9 @@ if __name__ == '__main__':
             db.session.commit()
             print("Admin Created: admin@example.com / admin123")
 
+    # Opt-in model warm-up (PRELOAD_MODELS)
+    from app.inference import warm_up_worker
+    warm_up_worker(app.config)
+
     # Run App
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,69 @@
+# Regression check for the hot-query indexes: builds a throwaway SQLite
+# database from the models and asserts, via EXPLAIN QUERY PLAN, that each hot
+# query searches its index instead of scanning the table.
+# Usage: python test_query_plans.py
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects import sqlite
+
+from config import Config
+from app import create_app, db
+from app.attendance import ATTENDED_STATUSES
+from app.models import Attendance, Session, UnknownFace
+from app.main.api_routes import day_bounds
+
+
+def explain(query):
+    compiled = query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return [row[-1] for row in rows]
+
+
+def hot_queries():
+    day_start, day_end = day_bounds(date.today())
+    return [
+        ("marked students of a session", 'ix_attendance_session_student',
+         db.session.query(Attendance.student_id).filter_by(session_id=1)),
+        ("student history in time order", 'ix_attendance_student_time',
+         Attendance.query.filter_by(student_id=1).order_by(Attendance.time_marked)),
+        ("latest attendance", 'ix_attendance_time_marked',
+         Attendance.query.filter(Attendance.status.in_(ATTENDED_STATUSES))
+         .order_by(Attendance.time_marked.desc()).limit(1)),
+        ("unknown faces today", 'ix_unknown_face_timestamp',
+         UnknownFace.query.filter(UnknownFace.timestamp >= day_start, UnknownFace.timestamp < day_end)),
+        ("sessions on a date", 'ix_session_date',
+         Session.query.filter(Session.date == date.today())),
+        ("sessions of a subject", 'ix_session_subject_date',
+         Session.query.filter_by(subject_id=1)),
+    ]
+
+
+class PlanConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plans.db')
+    PRELOAD_MODELS = False
+
+
+if __name__ == '__main__':
+    app = create_app(PlanConfig)
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.text("ANALYZE"))
+        for label, index, query in hot_queries():
+            plan = explain(query)
+            uses_index = any(index in step for step in plan)
+            sorts = any('TEMP B-TREE' in step for step in plan)
+            if uses_index and not sorts:
+                print(f"   OK   {label}: {index}")
+            else:
+                failures += 1
+                print(f"   FAIL {label}: expected {index} without a sort, got {plan}")
+
+    print(f"\n{'All query plans use their indexes.' if not failures else f'{failures} query plan(s) regressed.'}")
+    sys.exit(1 if failures else 0)
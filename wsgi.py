@@ -1,6 +1,7 @@
 # WSGI Entry Point
 import os
 from app import create_app, db
+from config import ProductionConfig
 
 # Apply patches if necessary (copied from run.py)
 import numpy as np
@@ -18,7 +19,7 @@ try:
 except Exception as e:
     print(f"NumPy Patch Error: {e}")
 
-app = create_app()
+app = create_app(ProductionConfig)
 
 if __name__ == "__main__":
     app.run()